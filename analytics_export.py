@@ -0,0 +1,302 @@
+"""Columnar export of test history, attempts and user progress for offline analytics.
+
+Writes Parquet datasets partitioned Hive-style by subject (lowercased, as in
+dist_topic.json) and, for the SQL history, by date, e.g.
+
+    <output>/attempts/subject=physics/date=2026-10-19/part-00000.parquet
+
+(subject and date are directory names, not columns inside the files), so
+pandas/pyarrow can load a slice with filters instead of querying production:
+
+    pd.read_parquet('analytics/attempts', filters=[('subject', '=', 'physics')])
+
+Datasets:
+    tests        one row per TestHistory, partitioned by completed_at date
+    attempts     one row per QuestionAttempt with its test's user/subject/topic
+    questions    the generated question, answer, hint, concept and solution per attempt
+    progress     user_progress flattened to (user_id, subject, topic), by subject only
+    performance  user_performance flattened to (user_id, kind, subject, key), by subject only
+
+Re-running into the same directory rewrites every date partition the run
+covers. progress and performance are snapshots of the current documents: each
+run replaces the whole dataset (the time it was taken is in _EXPORTED_AT), so
+reading it never mixes two snapshots.
+
+SQL rows are streamed with yield_per (server-side cursors where the driver has
+them) and MongoDB documents with a batched cursor, so memory stays at one chunk
+plus one open writer per partition. pyarrow is optional (rag_requirements.txt)
+and only imported here.
+"""
+import glob
+import os
+import shutil
+from datetime import datetime, timezone
+
+TEST_FIELDS = [
+    ('test_id', 'int64'), ('user_id', 'int64'), ('topic', 'string'),
+    ('score', 'int64'), ('time_taken', 'int64'), ('completed_at', 'timestamp'),
+]
+ATTEMPT_FIELDS = [
+    ('attempt_id', 'int64'), ('test_id', 'int64'), ('user_id', 'int64'), ('topic', 'string'),
+    ('completed_at', 'timestamp'), ('difficulty', 'string'), ('is_correct', 'bool'),
+    ('answered', 'bool'), ('hint_used', 'bool'), ('solution_viewed', 'bool'), ('concept_clarity_viewed', 'bool'),
+]
+QUESTION_FIELDS = [
+    ('attempt_id', 'int64'), ('test_id', 'int64'), ('topic', 'string'), ('completed_at', 'timestamp'),
+    ('difficulty', 'string'), ('question_text', 'string'),
+    ('correct_answer', 'string'), ('user_answer', 'string'), ('hint', 'string'), ('concept', 'string'),
+    ('solution', 'string'),
+]
+PROGRESS_FIELDS = [
+    ('user_id', 'string'), ('topic', 'string'), ('mastery_level', 'int64'),
+    ('total_attempts', 'int64'), ('correct_attempts', 'int64'), ('average_time', 'float64'),
+    ('consecutive_correct', 'int64'), ('consecutive_incorrect', 'int64'),
+    ('last_review', 'string'), ('next_review', 'string'),
+]
+PERFORMANCE_FIELDS = [
+    ('user_id', 'string'), ('kind', 'string'), ('key', 'string'),
+    ('total_attempts', 'int64'), ('correct_attempts', 'int64'), ('average_time', 'float64'),
+    ('last_5_times', 'list<float64>'), ('last_5_accuracy', 'list<float64>'), ('last_review', 'string'),
+]
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('The analytics export needs pyarrow: pip install -r rag_requirements.txt')
+    return pyarrow
+
+
+def arrow_schema(pa, fields):
+    types = {
+        'int64': pa.int64(), 'float64': pa.float64(), 'bool': pa.bool_(), 'string': pa.string(),
+        'timestamp': pa.timestamp('us'), 'list<float64>': pa.list_(pa.float64()),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+def partition_subject(subject):
+    # SQL stores the subject as shown in the UI and MongoDB as the dist_topic.json key;
+    # question types and concepts are not tied to one subject
+    return subject.lower() if subject else 'all'
+
+
+class PartitionedWriter:
+    """One open Parquet writer per partition of a dataset.
+
+    Rows are partitioned by subject and, with ``partition_date``, by
+    ``partition_date(row)``. The first time a run opens a partition it deletes
+    the part files an earlier run left there.
+    """
+
+    def __init__(self, pa, root, fields, partition_date=None):
+        self.pa = pa
+        self.root = root
+        self.schema = arrow_schema(pa, fields)
+        self.partition_date = partition_date
+        self.writers = {}
+        self.parts = {}
+        self.rows = 0
+
+    def _directory(self, key):
+        subject, day = key
+        parts = [self.root, f'subject={subject}'] + ([f'date={day}'] if day is not None else [])
+        return os.path.join(*parts)
+
+    def write(self, rows):
+        """Append ``rows`` (dicts) under each row's partition."""
+        groups = {}
+        for row in rows:
+            day = self.partition_date(row) if self.partition_date else None
+            groups.setdefault((partition_subject(row['subject']), day), []).append(row)
+        for key, group in groups.items():
+            writer = self.writers.get(key)
+            if writer is None:
+                directory = self._directory(key)
+                part = self.parts.get(key, 0)
+                if part == 0:
+                    for stale in glob.glob(os.path.join(directory, 'part-*.parquet')):
+                        os.remove(stale)
+                os.makedirs(directory, exist_ok=True)
+                # A partition closed early (rows out of date order) gets another part file
+                self.parts[key] = part + 1
+                writer = self.pa.parquet.ParquetWriter(os.path.join(directory, f'part-{part:05d}.parquet'),
+                                                       self.schema)
+                self.writers[key] = writer
+            writer.write_table(self.pa.Table.from_pylist(group, schema=self.schema))
+            self.rows += len(group)
+
+    def close_before(self, day):
+        """Close partitions older than ``day``; rows arrive in date order so they are complete."""
+        for key in [key for key in self.writers if key[1] < day]:
+            self.writers.pop(key).close()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def _day(value):
+    return value.date().isoformat() if value else 'unknown'
+
+
+def export_sql(pa, output_dir, chunk_size, since=None, until=None):
+    """Stream TestHistory and QuestionAttempt into the tests, attempts and questions datasets."""
+    from app import db, TestHistory, QuestionAttempt
+
+    counts = {}
+    window = []
+    if since:
+        window.append(TestHistory.completed_at >= since)
+    if until:
+        window.append(TestHistory.completed_at < until)
+
+    completed_day = lambda row: _day(row['completed_at'])
+    tests = PartitionedWriter(pa, os.path.join(output_dir, 'tests'), TEST_FIELDS, completed_day)
+    stmt = (
+        db.select(TestHistory.id, TestHistory.user_id, TestHistory.subject, TestHistory.topic,
+                  TestHistory.score, TestHistory.time_taken, TestHistory.completed_at)
+        .where(*window)
+        .order_by(TestHistory.completed_at, TestHistory.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for chunk in db.session.execute(stmt).partitions():
+        rows = [dict(zip(('test_id', 'user_id', 'subject', 'topic', 'score', 'time_taken', 'completed_at'), row))
+                for row in chunk]
+        tests.write(rows)
+        tests.close_before(_day(rows[-1]['completed_at']))
+    tests.close()
+    counts['tests'] = tests.rows
+
+    attempts = PartitionedWriter(pa, os.path.join(output_dir, 'attempts'), ATTEMPT_FIELDS, completed_day)
+    questions = PartitionedWriter(pa, os.path.join(output_dir, 'questions'), QUESTION_FIELDS, completed_day)
+    # Plain columns rather than QuestionAttempt entities, so no ORM objects pile up in the session
+    attempt_columns = ('id', 'test_id', 'difficulty', 'is_correct', 'user_answer', 'hint_used', 'solution_viewed',
+                       'concept_clarity_viewed', 'question_text', 'correct_answer', 'hint', 'concept', 'solution')
+    stmt = (
+        db.select(*[getattr(QuestionAttempt, name) for name in attempt_columns],
+                  TestHistory.user_id, TestHistory.subject, TestHistory.topic, TestHistory.completed_at)
+        .join(TestHistory, QuestionAttempt.test_id == TestHistory.id)
+        .where(*window)
+        .order_by(TestHistory.completed_at, QuestionAttempt.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for chunk in db.session.execute(stmt).partitions():
+        attempt_rows, question_rows = [], []
+        for row in chunk:
+            attempt = row._mapping
+            common = {'attempt_id': attempt['id'], 'test_id': attempt['test_id'], 'subject': attempt['subject'],
+                      'topic': attempt['topic'], 'completed_at': attempt['completed_at'],
+                      'difficulty': attempt['difficulty']}
+            attempt_rows.append({
+                **common,
+                'user_id': attempt['user_id'],
+                'is_correct': attempt['is_correct'],
+                'answered': bool(attempt['user_answer']),
+                'hint_used': attempt['hint_used'],
+                'solution_viewed': attempt['solution_viewed'],
+                'concept_clarity_viewed': attempt['concept_clarity_viewed'],
+            })
+            question_rows.append({
+                **common,
+                'question_text': attempt['question_text'],
+                'correct_answer': attempt['correct_answer'],
+                'user_answer': attempt['user_answer'],
+                'hint': attempt['hint'],
+                'concept': attempt['concept'],
+                'solution': attempt['solution'],
+            })
+        attempts.write(attempt_rows)
+        questions.write(question_rows)
+        last_day = _day(attempt_rows[-1]['completed_at'])
+        attempts.close_before(last_day)
+        questions.close_before(last_day)
+    attempts.close()
+    questions.close()
+    counts['attempts'] = attempts.rows
+    counts['questions'] = questions.rows
+    return counts
+
+
+def flatten_progress(doc):
+    for subject, topics in (doc.get('subjects') or {}).items():
+        for topic, data in topics.items():
+            yield {
+                'user_id': str(doc['_id']),
+                'subject': subject,
+                'topic': topic,
+                **{name: data.get(name) for name, _ in PROGRESS_FIELDS[2:]},
+            }
+
+
+def flatten_performance(doc):
+    from progress_stats import WindowedStats
+
+    def stats_row(kind, subject, key, data):
+        stats = WindowedStats.from_document(data)
+        return {
+            'user_id': str(doc['_id']), 'kind': kind, 'subject': subject, 'key': key,
+            'total_attempts': stats.total_attempts, 'correct_attempts': stats.correct_attempts,
+            'average_time': stats.average_time, 'last_5_times': stats.last_times,
+            'last_5_accuracy': stats.last_accuracies, 'last_review': None,
+        }
+
+    for question_type, data in (doc.get('question_types') or {}).items():
+        yield stats_row('question_type', None, question_type, data)
+    for subject, topics in (doc.get('topics') or {}).items():
+        for topic, data in topics.items():
+            yield stats_row('topic', subject, topic, data)
+    for concept, data in (doc.get('concepts') or {}).items():
+        yield {
+            'user_id': str(doc['_id']), 'kind': 'concept', 'subject': None, 'key': concept,
+            'total_attempts': data.get('total_attempts', 0), 'correct_attempts': data.get('correct_attempts', 0),
+            'average_time': None, 'last_5_times': None, 'last_5_accuracy': None,
+            'last_review': data.get('last_review'),
+        }
+
+
+def export_mongo(pa, output_dir, chunk_size):
+    """Snapshot every user_progress and user_performance document, partitioned by subject.
+
+    Each dataset is written next to the previous one and swapped in when complete.
+    """
+    from db_config import mongodb, unescape_document
+
+    counts = {}
+    for name, collection, fields, flatten in (
+        ('progress', mongodb.progress_collection, PROGRESS_FIELDS, flatten_progress),
+        ('performance', mongodb.performance_collection, PERFORMANCE_FIELDS, flatten_performance),
+    ):
+        root = os.path.join(output_dir, name)
+        staging = root + '.partial'
+        shutil.rmtree(staging, ignore_errors=True)
+        writer = PartitionedWriter(pa, staging, fields)
+        rows = []
+        for doc in collection.find({}).batch_size(chunk_size):
+            rows.extend(flatten(unescape_document(doc)))
+            if len(rows) >= chunk_size:
+                writer.write(rows)
+                rows = []
+        if rows:
+            writer.write(rows)
+        writer.close()
+        os.makedirs(staging, exist_ok=True)
+        shutil.rmtree(root, ignore_errors=True)
+        os.replace(staging, root)
+        counts[name] = writer.rows
+    return counts
+
+
+def export_analytics(output_dir, chunk_size=5000, since=None, until=None, include_mongo=True):
+    """Export every dataset into ``output_dir``; returns row counts per dataset."""
+    pa = import_pyarrow()
+    os.makedirs(output_dir, exist_ok=True)
+    counts = export_sql(pa, output_dir, chunk_size, since, until)
+    if include_mongo:
+        counts.update(export_mongo(pa, output_dir, chunk_size))
+    with open(os.path.join(output_dir, '_EXPORTED_AT'), 'w', encoding='utf-8') as f:
+        f.write(datetime.now(timezone.utc).isoformat() + '\n')
+    return counts
@@ -6,33 +6,78 @@ import json
 import logging
 import threading
 from datetime import datetime, date, UTC
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, make_response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, make_response, abort
 from flask_sqlalchemy import SQLAlchemy
+from flask_cors import CORS
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-import google.genai as genai
-from google.cloud import storage
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from flask_migrate import Migrate, upgrade
+from sqlalchemy.exc import IntegrityError
 import re
-from pydantic import BaseModel
-from typing import List, Optional
+import sys
+import subprocess
 import uuid
 import concurrent.futures
 import time
-import signal
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as ThreadTimeoutError
-from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 import click
+import logging_setup
+import metrics
+import tracing
+from gemini_config import GEMINI_MAX_CONCURRENCY, GEMINI_TIMEOUT_SECONDS, QUESTION_DIFFICULTIES
+from gemini_outputs import RawOutputRing
+from tracing import span
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Heavy client libraries (google.genai, google.cloud.storage, google_auth_oauthlib,
+# pydantic via question_schema, flask_migrate) are imported on first use so that
+# worker boot and CLI commands stay fast; see `flask import-time-report`.
+
+# Configure logging (JSON records written by a background thread; see logging_setup.py)
+logging_setup.configure()
 logger = logging.getLogger(__name__)
+raw_output_logger = logging.getLogger(logging_setup.RAW_OUTPUT_LOGGER)
+
+# Google Cloud Storage client, created on first use (and again after fork)
+storage_client = None
+storage_client_lock = threading.Lock()
+
+def get_storage_client():
+    global storage_client
+    if storage_client is None:
+        with storage_client_lock:
+            if storage_client is None:
+                from google.cloud import storage
+                storage_client = storage.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT'))
+    return storage_client
+
+# Offline mode: read the bucket's data files from a local directory laid out
+# like the repo's data/ folder instead of GCS (benchmarks, local development).
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR')
+LOCAL_DATA_PATHS = {
+    'static/original_questions.json': 'questions/original_questions.json',
+    'static/dist_topic.json': 'distributions/dist_topic.json',
+}
+
+def local_data_path(blob_name):
+    if blob_name.startswith('md_files/'):
+        return os.path.join(LOCAL_DATA_DIR, 'content', blob_name[len('md_files/'):])
+    return os.path.join(LOCAL_DATA_DIR, LOCAL_DATA_PATHS.get(blob_name, blob_name))
 
-# Google Cloud Storage client
-storage_client = storage.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT'))
+def download_data_text(blob_name):
+    """Return the text of a data file from GCS (or LOCAL_DATA_DIR), or None if it does not exist."""
+    if LOCAL_DATA_DIR:
+        path = local_data_path(blob_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    bucket_name = os.getenv('GCS_BUCKET_NAME')
+    if not bucket_name:
+        raise ValueError("GCS_BUCKET_NAME environment variable not set.")
+    blob = get_storage_client().bucket(bucket_name).blob(blob_name)
+    if not blob.exists():
+        return None
+    with metrics.timed(metrics.GCS_DOWNLOAD_LATENCY, object=blob_name.rsplit('/', 1)[-1]):
+        return blob.download_as_text()
 
 # Allow OAuth2 to work with HTTP for local development
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
@@ -50,15 +95,47 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 #         logger.error(f'Error configuring Gemini: {e}')
 #         return None
 
+# One client and one bounded pool per worker process, shared by all request
+# threads (gthread) or greenlets (gevent); both are safe for concurrent use.
+gemini_client = None
+gemini_client_lock = threading.Lock()
+gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix='gemini')
+# Recent raw outputs of this worker, served by /api/debug-gemini-output
+gemini_raw_outputs = RawOutputRing(int(os.getenv('GEMINI_RAW_OUTPUT_BUFFER', '200')))
+
+def get_gemini_client(api_key):
+    global gemini_client
+    if gemini_client is None:
+        with gemini_client_lock:
+            if gemini_client is None:
+                import google.genai as genai
+                # Socket-level deadline so an abandoned call does not pin a pool thread forever
+                http_options = {'timeout': int(GEMINI_TIMEOUT_SECONDS * 1000)}
+                if os.getenv('GEMINI_BASE_URL'):
+                    # e.g. the local stand-in started by bench_load_test.py
+                    http_options['base_url'] = os.getenv('GEMINI_BASE_URL')
+                gemini_client = genai.Client(api_key=api_key, http_options=http_options)
+    return gemini_client
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 # Use DATABASE_URL from environment if available, otherwise fall back to SQLite
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///jee_gurukul.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Threaded workers share one pool per process; size it to the request threads
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(
+        pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+    )
 
 # Initialize extensions
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+    # Flask-Migrate (and Alembic behind it) is only needed by `flask db ...`
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
@@ -82,19 +159,14 @@ original_questions_lock = threading.Lock()
 def load_original_questions():
     global original_questions_cache, original_questions_set
     with original_questions_lock:
+        metrics.record_cache('original_questions', original_questions_cache is not None)
         if original_questions_cache is not None:
             return
         try:
-            bucket_name = os.getenv('GCS_BUCKET_NAME')
-            if not bucket_name:
-                logger.error('GCS_BUCKET_NAME not set')
-                return
-            bucket = storage_client.bucket(bucket_name)
-            blob = bucket.blob('static/original_questions.json')
-            if not blob.exists():
+            content = download_data_text('static/original_questions.json')
+            if content is None:
                 logger.error('original_questions.json not found in GCS')
                 return
-            content = blob.download_as_text()
             original_questions_cache = json.loads(content)
             # Normalize all questions for fast comparison
             original_questions_set.clear()
@@ -130,9 +202,10 @@ class User(UserMixin, db.Model):
     date_of_birth = db.Column(db.Date)
     mobile_number = db.Column(db.String(15))
     google_id = db.Column(db.String(100), unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.now(UTC))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     last_login = db.Column(db.DateTime)
-    test_history = db.relationship('TestHistory', backref='user', lazy=True)
+    test_history = db.relationship('TestHistory', backref='user', lazy=True,
+                                   order_by='TestHistory.completed_at.desc()')
 
 class TestHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -141,8 +214,14 @@ class TestHistory(db.Model):
     topic = db.Column(db.String(100), nullable=False)
     score = db.Column(db.Integer)
     time_taken = db.Column(db.Integer)  # in seconds
-    completed_at = db.Column(db.DateTime, default=datetime.now(UTC))
-    questions = db.relationship('QuestionAttempt', backref='test', lazy=True)
+    completed_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    questions = db.relationship('QuestionAttempt', backref='test', lazy=True,
+                                order_by='QuestionAttempt.id')
+
+    # Dashboard / recent-activity lookups: WHERE user_id = ? ORDER BY completed_at DESC
+    __table_args__ = (
+        db.Index('ix_test_history_user_id_completed_at', user_id, completed_at.desc()),
+    )
 
 class QuestionAttempt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -159,47 +238,219 @@ class QuestionAttempt(db.Model):
     concept = db.Column(db.Text)
     solution = db.Column(db.Text)  # New field for step-by-step solution
 
+    # Results page and submit path: WHERE test_id = ? ORDER BY id
+    __table_args__ = (
+        db.Index('ix_question_attempt_test_id_id', test_id, id),
+    )
+
+class UserTopicStats(db.Model):
+    """Running per-user totals for one subject/topic, kept up to date by submit_test."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    subject = db.Column(db.String(50), nullable=False)
+    topic = db.Column(db.String(100), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # submitted tests
+    correct = db.Column(db.Integer, nullable=False, default=0)  # question counts
+    incorrect = db.Column(db.Integer, nullable=False, default=0)
+    unattempted = db.Column(db.Integer, nullable=False, default=0)
+    total_score = db.Column(db.Integer, nullable=False, default=0)
+    total_time = db.Column(db.Integer, nullable=False, default=0)  # in seconds
+    last_attempt_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'subject', 'topic', name='uq_user_topic_stats_user_subject_topic'),
+    )
+
+    def to_dict(self):
+        answered = self.correct + self.incorrect
+        return {
+            'subject': self.subject,
+            'topic': self.topic,
+            'attempts': self.attempts,
+            'correct': self.correct,
+            'incorrect': self.incorrect,
+            'unattempted': self.unattempted,
+            'accuracy': self.correct / answered if answered else None,
+            'total_score': self.total_score,
+            'total_time': self.total_time,
+            'last_attempt_at': self.last_attempt_at.isoformat() if self.last_attempt_at else None,
+        }
+
+class UserSnapshot(UserMixin):
+    """Immutable view of the User columns the request path reads; what current_user holds."""
+    FIELDS = ('id', 'email', 'full_name', 'google_id', 'date_of_birth', 'mobile_number')
+
+    def __init__(self, row):
+        for field in self.FIELDS:
+            object.__setattr__(self, field, getattr(row, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserSnapshot is read-only; update the User row and invalidate the snapshot')
+
+# Per-worker TTL cache of user snapshots so authenticated requests skip the user lookup.
+# Entries are dropped on login and profile updates; other workers converge within the TTL.
+USER_SNAPSHOT_TTL = float(os.getenv('USER_SNAPSHOT_TTL_SECONDS', '60'))
+USER_SNAPSHOT_MAX_ENTRIES = int(os.getenv('USER_SNAPSHOT_MAX_ENTRIES', '10000'))
+user_snapshot_cache = {}
+user_snapshot_lock = threading.Lock()
+
+def invalidate_user_snapshot(user_id):
+    with user_snapshot_lock:
+        user_snapshot_cache.pop(int(user_id), None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    now = time.monotonic()
+    with user_snapshot_lock:
+        entry = user_snapshot_cache.get(user_id)
+    hit = bool(entry and entry[0] > now)
+    metrics.record_cache('user_snapshot', hit)
+    if hit:
+        return entry[1]
+    row = db.session.execute(
+        db.select(*(getattr(User, field) for field in UserSnapshot.FIELDS)).where(User.id == user_id)
+    ).first()
+    if row is None:
+        invalidate_user_snapshot(user_id)
+        return None
+    snapshot = UserSnapshot(row)
+    with user_snapshot_lock:
+        if user_id not in user_snapshot_cache and len(user_snapshot_cache) >= USER_SNAPSHOT_MAX_ENTRIES:
+            # Oldest insertion first; expired entries are the likeliest to be at the front
+            user_snapshot_cache.pop(next(iter(user_snapshot_cache)))
+        user_snapshot_cache[user_id] = (now + USER_SNAPSHOT_TTL, snapshot)
+    return snapshot
+
+# Read-only datasets, loaded once per process (once in the gunicorn master when
+# preloading, then shared copy-on-write with the workers).
+MMD_SUBJECT_MAPPING = {
+    'mathematics': 'math',
+    'physics': 'physics',
+    'chemistry': 'chemistry',
+    'math': 'math'  # Also handle 'math' directly
+}
+mmd_content_cache = {}  # mmd subject -> (content, content.lower())
+mmd_content_lock = threading.Lock()
+topic_distribution_cache = None
+topic_distribution_lock = threading.Lock()
+
+def load_mmd_content(subject):
+    """Return (content, lowercased content) of a subject's MMD book, downloading it once per process."""
+    mmd_subject = MMD_SUBJECT_MAPPING.get(subject.lower(), subject.lower())
+    cached = mmd_content_cache.get(mmd_subject)
+    metrics.record_cache('mmd_content', cached is not None)
+    if cached is not None:
+        return cached
+    with mmd_content_lock:
+        if mmd_subject in mmd_content_cache:
+            return mmd_content_cache[mmd_subject]
+        mmd_file = f'md_files/{mmd_subject}.mmd'
+        mmd_content = download_data_text(mmd_file)
+        if mmd_content is None:
+            logger.error(f"MMD file {mmd_file} not found")
+            return None
+        if not mmd_content:
+            return None
+        mmd_content_cache[mmd_subject] = (mmd_content, mmd_content.lower())
+        logger.info(f'Loaded {mmd_file} ({len(mmd_content)} chars)')
+        return mmd_content_cache[mmd_subject]
+
+def load_topic_distribution():
+    """Return the parsed dist_topic.json, downloading it once per process."""
+    global topic_distribution_cache
+    with topic_distribution_lock:
+        metrics.record_cache('topic_distribution', topic_distribution_cache is not None)
+        if topic_distribution_cache is not None:
+            return topic_distribution_cache
+        blob_name = "static/dist_topic.json"
+        content = download_data_text(blob_name)
+        if content is None:
+            logger.error(f"{blob_name} not found")
+            return {}
+        try:
+            topic_distribution_cache = json.loads(content)
+        except Exception as e:
+            logger.error(f"Error reading or parsing {blob_name}: {e}")
+            return {}
+        return topic_distribution_cache
+
+def preload_read_only_data():
+    """Warm every read-only dataset in this process; used by gunicorn's preload mode."""
+    load_original_questions()
+    for subject in ('math', 'physics', 'chemistry'):
+        try:
+            load_mmd_content(subject)
+        except Exception as e:
+            logger.error(f"Error preloading MMD content for {subject}: {e}")
+    try:
+        load_topic_distribution()
+    except Exception as e:
+        logger.error(f"Error preloading topic distribution: {e}")
+    if os.getenv('PRELOAD_RAG') == '1':
+        # Load the embedding model before forking so workers share its weights
+        from rag_engine import get_rag_engine
+        get_rag_engine().model
+
+def reset_after_fork():
+    """Replace per-process clients inherited from the gunicorn master.
+
+    HTTP clients, the Gemini thread pool and pooled database connections are
+    not fork-safe; the read-only caches above are kept and shared.
+    """
+    global storage_client, gemini_client, gemini_executor
+    logging_setup.restart_after_fork()
+    storage_client = None
+    gemini_client = None
+    gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix='gemini')
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+# (subject, topic) pairs allowed as metric labels; built once per process, and
+# left empty for the process if dist_topic.json cannot be loaded
+metric_topics = None
+
+def metric_subject_label(subject):
+    """Subject as a metric label: 'math' and 'mathematics' are one series, anything else is 'other'."""
+    return MMD_SUBJECT_MAPPING.get(subject.lower(), 'other')
+
+def metric_topic_label(subject, topic):
+    """Topic as a metric label: only dist_topic.json topics, so user input cannot add series."""
+    global metric_topics
+    if metric_topics is None:
+        try:
+            distribution = load_topic_distribution()
+        except Exception:
+            distribution = {}
+        metric_topics = frozenset((metric_subject_label(name), known_topic)
+                                  for name, topics in distribution.items() for known_topic in topics)
+    return topic if (metric_subject_label(subject), topic) in metric_topics else 'other'
+
+def commit_session(operation):
+    """Commit the current session, recording the commit latency under ``operation``."""
+    with span('db.commit', operation=operation), \
+            metrics.timed(metrics.DB_COMMIT_LATENCY, operation=operation):
+        db.session.commit()
 
 # Question Generation Functions
 def get_mmd_content_for_topic(subject, topic):
     """Get relevant MMD content for a specific topic from the main MMD file."""
+    with span('retrieve_context', subject=subject, topic=topic), \
+            metrics.timed(metrics.RETRIEVAL_LATENCY, subject=metric_subject_label(subject)):
+        return _get_mmd_content_for_topic(subject, topic)
+
+def _get_mmd_content_for_topic(subject, topic):
     try:
-        bucket_name = os.getenv('GCS_BUCKET_NAME')
-        if not bucket_name:
-            raise ValueError("GCS_BUCKET_NAME environment variable not set.")
-        
-        bucket = storage_client.bucket(bucket_name)
-        
-        # Map subject names to MMD file names
-        subject_mapping = {
-            'mathematics': 'math',
-            'physics': 'physics', 
-            'chemistry': 'chemistry',
-            'math': 'math'  # Also handle 'math' directly
-        }
-        
-        mmd_subject = subject_mapping.get(subject.lower(), subject.lower())
-        mmd_file = f'md_files/{mmd_subject}.mmd'
-        blob = bucket.blob(mmd_file)
-        
-        if not blob.exists():
-            logger.error(f"MMD file {mmd_file} not found in GCS bucket {bucket_name}")
-            return None
-        
-        mmd_content = blob.download_as_text()
-        if not mmd_content:
+        loaded = load_mmd_content(subject)
+        if not loaded:
             return None
+        mmd_content, content_lower = loaded
         
         # Simple search for topic in the markdown content
         topic_lower = topic.lower()
-        content_lower = mmd_content.lower()
+        start_idx = content_lower.find(topic_lower)
         
-        if topic_lower in content_lower:
-            # Find the topic in the content
-            start_idx = content_lower.find(topic_lower)
+        if start_idx != -1:
             # Get context around the topic (1000 chars before and 2000 chars after)
             start_context = max(0, start_idx - 1000)
             end_context = min(len(mmd_content), start_idx + 2000)
@@ -221,23 +472,11 @@ def extract_json_from_text(text):
         logger.error(f"Error extracting JSON: {e}")
     return None
 
-# Pydantic models for structured output
-class Option(BaseModel):
-    id: str  # A, B, C, D
-    text: str
-
-class QuestionData(BaseModel):
-    question_text: str
-    options: List[Option]
-    correct_answer: str
-    solution: str
-    difficulty: str = "medium"
-    hint: Optional[str] = None
-    concept: Optional[List[str]] = None  # Now a list of bullet points
-
 def generate_question_rag_structured(subject, topic, difficulty="medium"):
     """Generate question using Google's structured output with Pydantic models, with timeout and robust fallback."""
-    load_original_questions()
+    from question_schema import QuestionData
+    with span('load_original_questions'):
+        load_original_questions()
     mmd_content = get_mmd_content_for_topic(subject, topic)
     if not mmd_content:
         return fallback_question(subject, topic, difficulty, reason='no_mmd')
@@ -245,7 +484,8 @@ def generate_question_rag_structured(subject, topic, difficulty="medium"):
     if not api_key:
         logger.error('GOOGLE_API_KEY not found in environment!')
         return fallback_question(subject, topic, difficulty, reason='no_api_key')
-    prompt = f"""Generate a JEE-level {subject} question about {topic} with difficulty {difficulty}.
+    with span('build_prompt') as prompt_span:
+        prompt = f"""Generate a JEE-level {subject} question about {topic} with difficulty {difficulty}.
 Content reference: {mmd_content[:1500]}
 Requirements:
 1. Create a challenging but fair question
@@ -260,55 +500,80 @@ Requirements:
 6. Ensure the correct answer is one of the options
 7. Make the question relevant to the provided content
 Return a structured JSON object with these fields: question_text, options, correct_answer, solution, hint, concept (as a list of bullet points), difficulty."""
+        prompt_span.set(prompt_chars=len(prompt))
+    call_info = {}
     def call_gemini():
         try:
-            client = genai.Client(api_key=api_key)
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_schema": QuestionData,
-                },
-            )
-            logger.info(f"[Gemini raw output]: {response.text}")
+            client = get_gemini_client(api_key)
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                with span('call_gemini', model="gemini-2.0-flash"):
+                    response = client.models.generate_content(
+                        model="gemini-2.0-flash",
+                        contents=prompt,
+                        config={
+                            "response_mime_type": "application/json",
+                            "response_schema": QuestionData,
+                        },
+                    )
+                outcome = 'ok'
+                usage = getattr(response, 'usage_metadata', None)
+                call_info['prompt_tokens'] = getattr(usage, 'prompt_token_count', None) or 0
+                call_info['output_tokens'] = getattr(usage, 'candidates_token_count', None) or 0
+            finally:
+                call_info['latency_ms'] = (time.perf_counter() - start) * 1000
+                metrics.GEMINI_LATENCY.labels(outcome=outcome).observe(call_info['latency_ms'] / 1000)
+            raw_output_logger.info(f"[Gemini raw output]: {response.text}")
             return response
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
             return None
     logger.info(f"[Gemini] Generating question for {subject}/{topic} ({difficulty})...")
-    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(call_gemini)
-        try:
-            response = future.result(timeout=30)
-            if response is None:
-                logger.error("Gemini API returned None, using fallback.")
-                return fallback_question(subject, topic, difficulty, reason='gemini_error')
-            question_data: QuestionData = response.parsed
-            question = {
-                'id': str(uuid.uuid4()),
-                'question_text': question_data.question_text,
-                'options': [f"{opt.id}) {opt.text}" for opt in question_data.options],
-                'correct_answer': question_data.correct_answer,
-                'solution': question_data.solution,
-                'difficulty': question_data.difficulty,
-                'subject': subject,
-                'topic': topic,
-                'hint': getattr(question_data, 'hint', None),
-                'concept': getattr(question_data, 'concept', None),
-                'raw_gemini_output': response.text,
-                'raw_gemini_output_step1': [response.text],
-                'raw_gemini_output_step2': [response.text],
-                'raw_gemini_output_step3': [response.text]
-            }
-            logger.info(f"[Gemini] ✓ Question generated successfully.")
-            return question
-        except concurrent.futures.TimeoutError:
-            logger.error("Gemini API call timed out, using fallback.")
-            return fallback_question(subject, topic, difficulty, reason='timeout')
-        except Exception as e:
-            logger.error(f"Error in structured question generation: {e}")
-            return fallback_question(subject, topic, difficulty, reason=f'structured_error: {str(e)}')
+    # Run in a copy of this request's context so the call's span joins its trace
+    future = gemini_executor.submit(tracing.in_current_context(call_gemini))
+    try:
+        with span('wait_gemini', timeout_s=GEMINI_TIMEOUT_SECONDS):
+            response = future.result(timeout=GEMINI_TIMEOUT_SECONDS)
+        if response is None:
+            logger.error("Gemini API returned None, using fallback.")
+            return fallback_question(subject, topic, difficulty, reason='gemini_error')
+        with span('parse_response'):
+            question_data = response.parsed
+        raw_output_id = gemini_raw_outputs.record(
+            response.text or '', subject=subject, topic=topic, difficulty=difficulty,
+            latency_ms=round(call_info.get('latency_ms', 0)),
+            prompt_tokens=call_info.get('prompt_tokens', 0), output_tokens=call_info.get('output_tokens', 0),
+            status='parsed' if question_data is not None else 'parse_error',
+            request_id=tracing.current_request_id())
+        if question_data is None:
+            logger.error(f"Gemini output {raw_output_id} did not match the schema, using fallback.")
+            return fallback_question(subject, topic, difficulty, reason='parse_error')
+        question = {
+            'id': str(uuid.uuid4()),
+            'question_text': question_data.question_text,
+            'options': [f"{opt.id}) {opt.text}" for opt in question_data.options],
+            'correct_answer': question_data.correct_answer,
+            'solution': question_data.solution,
+            'difficulty': question_data.difficulty,
+            'subject': subject,
+            'topic': topic,
+            'hint': getattr(question_data, 'hint', None),
+            'concept': getattr(question_data, 'concept', None),
+            'raw_output_id': raw_output_id,
+        }
+        metrics.QUESTIONS_GENERATED.labels(subject=metric_subject_label(subject), topic=metric_topic_label(subject, topic)).inc()
+        logger.info(f"[Gemini] ✓ Question generated successfully.")
+        return question
+    except concurrent.futures.TimeoutError:
+        # Only takes effect while the call is still queued behind GEMINI_MAX_CONCURRENCY
+        # others; a running call cannot be interrupted and finishes in the background
+        future.cancel()
+        logger.error("Gemini API call timed out, using fallback.")
+        return fallback_question(subject, topic, difficulty, reason='timeout')
+    except Exception as e:
+        logger.error(f"Error in structured question generation: {e}")
+        return fallback_question(subject, topic, difficulty, reason=f'structured_error: {str(e)}')
 
 # Update the main generation function to use structured output
 def generate_question_rag(subject, topic, difficulty="medium"):
@@ -335,7 +600,8 @@ def login():
             if user and user.password_hash and check_password_hash(user.password_hash, password):
                 login_user(user)
                 user.last_login = datetime.now(UTC)
-                db.session.commit()
+                commit_session('login')
+                invalidate_user_snapshot(user.id)
                 logger.info(f"User {email} logged in successfully.")
                 if request.is_json:
                     return jsonify({'user': {
@@ -387,7 +653,7 @@ def signup():
                 full_name=full_name
             )
             db.session.add(user)
-            db.session.commit()
+            commit_session('signup')
             login_user(user)
             logger.info(f"User {email} signed up successfully.")
             if request.is_json:
@@ -408,6 +674,7 @@ def signup():
 @app.route('/google-login')
 def google_login():
     try:
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_config(
             GOOGLE_CLIENT_CONFIG,
             scopes=['openid', 'https://www.googleapis.com/auth/userinfo.email', 'https://www.googleapis.com/auth/userinfo.profile']
@@ -426,6 +693,7 @@ def google_login():
 @app.route('/google-callback')
 def google_callback():
     try:
+        from google_auth_oauthlib.flow import Flow
         flow = Flow.from_client_config(
             GOOGLE_CLIENT_CONFIG,
             scopes=['openid', 'https://www.googleapis.com/auth/userinfo.email', 'https://www.googleapis.com/auth/userinfo.profile']
@@ -444,8 +712,9 @@ def google_callback():
                 full_name=user_info.get('name', '')
             )
             db.session.add(user)
-            db.session.commit()
+            commit_session('google_signup')
         login_user(user)
+        invalidate_user_snapshot(user.id)
         logger.info(f"Google user {user.email} logged in.")
         response = make_response(redirect(url_for('dashboard')))
         return response
@@ -457,42 +726,94 @@ def google_callback():
 @login_required
 def complete_profile():
     if request.method == 'POST':
-        current_user.full_name = request.form.get('full_name')
-        current_user.date_of_birth = datetime.strptime(request.form.get('dob'), '%Y-%m-%d')
-        current_user.mobile_number = request.form.get('mobile_number')
-        db.session.commit()
+        # current_user is a read-only snapshot; write through the User row
+        user = db.session.get(User, current_user.id)
+        user.full_name = request.form.get('full_name')
+        user.date_of_birth = datetime.strptime(request.form.get('dob'), '%Y-%m-%d')
+        user.mobile_number = request.form.get('mobile_number')
+        commit_session('complete_profile')
+        invalidate_user_snapshot(user.id)
         return redirect(url_for('dashboard'))
     return render_template('complete_profile.html')
 
+RECENT_ACTIVITY_LIMIT = 5
+
+def get_recent_activity(user_id, limit=RECENT_ACTIVITY_LIMIT):
+    """Return the user's latest tests, newest first, as lightweight rows.
+
+    A single LIMITed query over the (user_id, completed_at DESC) index; the
+    difficulty shown on the dashboard comes from a correlated subquery on the
+    first attempt of each test instead of lazy-loading every test's questions.
+    """
+    first_difficulty = (
+        db.select(QuestionAttempt.difficulty)
+        .where(QuestionAttempt.test_id == TestHistory.id)
+        .order_by(QuestionAttempt.id)
+        .limit(1)
+        .correlate(TestHistory)
+        .scalar_subquery()
+    )
+    return db.session.execute(
+        db.select(
+            TestHistory.id,
+            TestHistory.subject,
+            TestHistory.topic,
+            TestHistory.score,
+            TestHistory.completed_at,
+            first_difficulty.label('difficulty'),
+        )
+        .where(TestHistory.user_id == user_id)
+        .order_by(TestHistory.completed_at.desc())
+        .limit(limit)
+    ).all()
+
+def recent_activity_etag(user_id, limit=RECENT_ACTIVITY_LIMIT):
+    """Cheap validator for the recent-activity rows: the (id, score) pairs of the latest tests.
+
+    Reads only indexed columns, so an unchanged dashboard can be answered with a
+    304 before the difficulty subquery runs or any JSON is built.
+    """
+    latest = db.session.execute(
+        db.select(TestHistory.id, TestHistory.score)
+        .where(TestHistory.user_id == user_id)
+        .order_by(TestHistory.completed_at.desc())
+        .limit(limit)
+    ).all()
+    return 'ra-' + '.'.join(f'{row.id}:{row.score}' for row in latest)
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html')
-
-def get_topics_from_gcs(subject):
-    bucket_name = os.getenv('GCS_BUCKET_NAME')
-    if not bucket_name:
-        raise ValueError("GCS_BUCKET_NAME environment variable not set.")
+    return render_template('dashboard.html', recent_tests=get_recent_activity(current_user.id))
 
-    bucket = storage_client.bucket(bucket_name)
-    blob_name = "static/dist_topic.json"
-    blob = bucket.blob(blob_name)
+@app.route('/api/recent-activity')
+def api_recent_activity():
+    """Recent-activity rows for the dashboard auto-refresh, with ETag/304 support."""
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Authentication required'}), 401
+    etag = recent_activity_etag(current_user.id)
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = jsonify({'tests': [{
+            'id': test.id,
+            'subject': test.subject,
+            'topic': test.topic,
+            'score': test.score,
+            'completed_at': test.completed_at.strftime('%Y-%m-%d %H:%M') if test.completed_at else None,
+            'difficulty': test.difficulty,
+            'results_url': url_for('test_results', test_id=test.id),
+        } for test in get_recent_activity(current_user.id)]})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
-    if not blob.exists():
-        print(f"Error: {blob_name} not found in GCS bucket {bucket_name}")
-        return {}
-
-    try:
-        content = blob.download_as_text()
-        topics_data = json.loads(content)
-        
-        # Get the topics for the specific subject and extract only the topic names (keys)
-        # Use subject.lower() to match the keys in dist_topic.json
-        subject_topics_dict = topics_data.get(subject.lower(), {}) 
-        return list(subject_topics_dict.keys())
-    except Exception as e:
-        print(f"Error reading or parsing {blob_name} from GCS: {e}")
-        return {}
+def get_topics_from_gcs(subject):
+    topics_data = load_topic_distribution()
+    # Get the topics for the specific subject and extract only the topic names (keys)
+    # Use subject.lower() to match the keys in dist_topic.json
+    subject_topics_dict = topics_data.get(subject.lower(), {})
+    return list(subject_topics_dict.keys())
 
 @app.route('/subject/<subject>')
 @login_required
@@ -509,11 +830,9 @@ def subject_topics(subject):
 def start_test(subject, topic):
     return render_template('test.html', subject=subject, topic=topic)
 
-# Add a global variable to store last raw outputs for debug endpoint
-last_gemini_raw_outputs = {}
-
 def fallback_question(subject, topic, difficulty, reason=''):
     """Fallback question with new structured format"""
+    metrics.record_fallback(reason)
     return {
         'id': str(uuid.uuid4()),
         'question_text': f"Sample question about {topic}",
@@ -525,23 +844,34 @@ def fallback_question(subject, topic, difficulty, reason=''):
         'topic': topic,
         'is_fallback': True,
         'generation_status': reason,
-        'raw_gemini_output': f"Fallback question - {reason}",
-        'raw_gemini_output_step1': [f"Fallback - {reason}"],
-        'raw_gemini_output_step2': [f"Fallback - {reason}"],
-        'raw_gemini_output_step3': [f"Fallback - {reason}"]
     }
 
-def generate_all_questions(subject, topic, difficulties, test_id):
-    questions = []
+def generate_all_questions(subject, topic, difficulties, user_id):
+    """Generate a test's questions, then persist the test and its attempts in one short transaction.
+
+    All Gemini calls happen before the first flush so that no pooled database
+    connection is held for the (potentially minutes-long) generation.
+    """
+    # Hand back any connection checked out earlier in the request (e.g. by load_user)
+    db.session.close()
+    generated = []
     for i, difficulty in enumerate(difficulties):
-        logger.info(f"Generating question {i+1}/5 for {subject}/{topic} with difficulty {difficulty}")
-        question_data = generate_question_rag(subject, topic, difficulty)
+        logger.info(f"Generating question {i+1}/{len(difficulties)} for {subject}/{topic} with difficulty {difficulty}")
+        with span('generate_question', index=i, difficulty=difficulty):
+            generated.append((difficulty, generate_question_rag(subject, topic, difficulty)))
+
+    test = TestHistory(user_id=user_id, subject=subject, topic=topic)
+    db.session.add(test)
+    with span('db.flush', table='test_history'):
+        db.session.flush()  # Get test.id
+    questions = []
+    for difficulty, question_data in generated:
         # Serialize concept list to JSON string if it's a list
         concept_value = question_data.get('concept', [])
         if isinstance(concept_value, list):
             concept_value = json.dumps(concept_value)
         qa = QuestionAttempt(
-            test_id=test_id,
+            test_id=test.id,
             question_text=question_data.get('question_text', question_data.get('question', '')),
             correct_answer=question_data.get('correct_answer', 'A'),
             difficulty=question_data.get('difficulty', difficulty),
@@ -550,7 +880,8 @@ def generate_all_questions(subject, topic, difficulties, test_id):
             solution=question_data.get('solution', question_data.get('step_by_step_solution', 'No solution available.'))
         )
         db.session.add(qa)
-        db.session.flush()  # Get ID
+        with span('db.flush', table='question_attempt'):
+            db.session.flush()  # Get ID
         question = {
             'id': qa.id,  # Use DB ID for frontend
             'question_text': qa.question_text,
@@ -562,8 +893,8 @@ def generate_all_questions(subject, topic, difficulties, test_id):
             'topic': topic
         }
         questions.append(question)
-    db.session.commit()  # Commit all questions before returning
-    return questions
+    commit_session('generate_test')  # Commit test and questions before returning
+    return test, questions
 
 @app.route('/api/generate-test', methods=['POST'])
 def generate_test():
@@ -573,14 +904,10 @@ def generate_test():
         topic = data.get('topic')
         if not subject or not topic:
             return jsonify({'error': 'Subject and topic are required'}), 400
-        difficulties = ['easy', 'medium', 'hard', 'medium', 'easy']
+        difficulties = QUESTION_DIFFICULTIES
         if not current_user.is_authenticated:
             return jsonify({'error': 'Authentication required'}), 401
-        test = TestHistory(user_id=current_user.id, subject=subject, topic=topic)
-        db.session.add(test)
-        db.session.flush()  # Get test.id
-        questions = generate_all_questions(subject, topic, difficulties, test.id)
-        db.session.commit()  # Commit test and questions
+        test, questions = generate_all_questions(subject, topic, difficulties, current_user.id)
         return jsonify({
             'test_id': test.id,
             'questions': questions,
@@ -650,6 +977,54 @@ def get_concept_clarity():
         logger.error(f"Error getting concept clarity: {e}")
         return jsonify({'error': str(e)}), 500
 
+def tally_attempts(attempts):
+    """Count correct/incorrect/unattempted questions in a single pass."""
+    tally = {'total': 0, 'correct': 0, 'incorrect': 0, 'unattempted': 0}
+    for qa in attempts:
+        tally['total'] += 1
+        if qa.is_correct is None:
+            tally['unattempted'] += 1
+        elif qa.is_correct:
+            tally['correct'] += 1
+        else:
+            tally['incorrect'] += 1
+    return tally
+
+def record_topic_stats(user_id, subject, topic, **deltas):
+    """Apply counter deltas to the user's UserTopicStats row, creating it on first use.
+
+    Existing rows are bumped with ``column = column + delta`` so concurrent
+    submissions from several workers never lose an update.
+    """
+    now = datetime.now(UTC)
+    stats = UserTopicStats.query.filter_by(user_id=user_id, subject=subject, topic=topic).first()
+    if stats is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(UserTopicStats(user_id=user_id, subject=subject, topic=topic,
+                                              last_attempt_at=now, **deltas))
+            return
+        except IntegrityError:
+            # Another request created the row first; fall through and increment it.
+            stats = UserTopicStats.query.filter_by(user_id=user_id, subject=subject, topic=topic).one()
+    for column, delta in deltas.items():
+        if delta:
+            setattr(stats, column, getattr(UserTopicStats, column) + delta)
+    stats.last_attempt_at = now
+
+def get_topic_stats(user_id, subject=None):
+    """Per-topic summary rows for a user: O(topics) instead of scanning test history."""
+    query = UserTopicStats.query.filter_by(user_id=user_id)
+    if subject:
+        query = query.filter_by(subject=subject.lower())
+    return query.order_by(UserTopicStats.subject, UserTopicStats.topic).all()
+
+@app.route('/api/topic-stats')
+def api_topic_stats():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Authentication required'}), 401
+    return jsonify({'stats': [row.to_dict() for row in get_topic_stats(current_user.id, request.args.get('subject'))]})
+
 @app.route('/api/submit-test', methods=['POST'])
 @login_required
 def submit_test():
@@ -659,10 +1034,19 @@ def submit_test():
     test = TestHistory.query.get_or_404(test_id)
     if test.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
+    # One indexed range read on (test_id, id) instead of a primary-key lookup per answer
+    attempts = {
+        qa.id: qa
+        for qa in QuestionAttempt.query.filter_by(test_id=test.id).order_by(QuestionAttempt.id)
+    }
+    # A resubmission replaces the test's earlier contribution to the topic stats
+    resubmission = test.score is not None
+    previous = tally_attempts(attempts.values()) if resubmission else None
+    previous_score, previous_time = test.score or 0, test.time_taken or 0
     score = 0
     for answer in answers:
-        question = QuestionAttempt.query.get(answer['question_id'])
-        if question and question.test_id == test_id:
+        question = attempts.get(answer['question_id'])
+        if question:
             question.user_answer = answer['answer']
             if question.user_answer is None or question.user_answer == '':
                 question.is_correct = None  # Unattempted
@@ -677,7 +1061,17 @@ def submit_test():
                 score -= 1  # Incorrect
     test.score = score
     test.time_taken = time_taken  # Use the time_taken from frontend
-    db.session.commit()
+    current = tally_attempts(attempts.values())
+    record_topic_stats(
+        test.user_id, test.subject.lower(), test.topic,
+        attempts=0 if resubmission else 1,
+        correct=current['correct'] - (previous['correct'] if previous else 0),
+        incorrect=current['incorrect'] - (previous['incorrect'] if previous else 0),
+        unattempted=current['unattempted'] - (previous['unattempted'] if previous else 0),
+        total_score=score - previous_score,
+        total_time=(time_taken or 0) - previous_time,
+    )
+    commit_session('submit_test')
     return jsonify({
         'test_id': test_id,
         'score': score,
@@ -687,11 +1081,15 @@ def submit_test():
 @app.route('/test-results/<int:test_id>')
 @login_required
 def test_results(test_id):
-    test = TestHistory.query.get_or_404(test_id)
+    # Test and its attempts in a single round trip; the counts come from one pass over them
+    test = TestHistory.query.options(db.joinedload(TestHistory.questions)).filter_by(id=test_id).one_or_none()
+    if test is None:
+        abort(404)
     if test.user_id != current_user.id:
         return redirect(url_for('dashboard'))
-    
-    return render_template('test_results.html', test=test)
+    questions = test.questions
+    return render_template('test_results.html', test=test, questions=questions,
+                           tally=tally_attempts(questions))
 
 @app.route('/logout', methods=['POST'])
 @login_required
@@ -714,8 +1112,42 @@ def test_question_generation():
 @app.route('/api/debug-gemini-output', methods=['GET'])
 @login_required
 def debug_gemini_output():
-    global last_gemini_raw_outputs
-    return jsonify(last_gemini_raw_outputs)
+    """Recent raw Gemini outputs of this worker, newest first.
+
+    Filters: subject, topic, difficulty, status (parsed / parse_error); `limit`
+    (default 20, clamped to 1..buffer size); `text=1` to include the outputs. `id` returns one output in full.
+    """
+    try:
+        entry_id = request.args.get('id', type=int)
+        if entry_id is not None:
+            entry = gemini_raw_outputs.get(entry_id)
+            if entry is None:
+                return jsonify({'error': 'Output not found (it may have been overwritten)'}), 404
+            return jsonify(entry.to_dict(include_text=True))
+        entries = gemini_raw_outputs.entries(
+            limit=min(max(request.args.get('limit', 20, type=int), 1), gemini_raw_outputs.capacity),
+            subject=request.args.get('subject'),
+            topic=request.args.get('topic'),
+            difficulty=request.args.get('difficulty'),
+            status=request.args.get('status'),
+        )
+        include_text = request.args.get('text') == '1'
+        return jsonify({
+            'buffer': gemini_raw_outputs.stats(),
+            'outputs': [entry.to_dict(include_text=include_text) for entry in entries],
+        })
+    except Exception as e:
+        logger.error(f"Error reading Gemini outputs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition aggregated across all gunicorn workers."""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    body, content_type = metrics.render_latest()
+    return app.response_class(body, mimetype=None, content_type=content_type)
 
 @app.route('/api/me')
 def api_me():
@@ -744,7 +1176,53 @@ def init_db_command():
     db.create_all()
     print("Database initialized.")
 
+@app.cli.command("import-time-report")
+@click.option('--top', default=25, show_default=True, help='Number of imports to list.')
+@click.option('--module', default='app', show_default=True, help='Module whose import is measured.')
+def import_time_report_command(top, module):
+    """Import MODULE in a fresh interpreter under -X importtime and list the slowest imports."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=app.root_path,
+        env={**os.environ, 'FLASK_RUN_FROM_CLI': ''},
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        timings.append((int(cumulative_us), int(self_us), name.rstrip()))
+    if result.returncode != 0 or not timings:
+        print(result.stderr[-2000:])
+        raise click.ClickException(f"Importing {module} failed")
+    total = next((t for t in timings if t[2].strip() == module), max(timings))
+    print(f"Importing {module} took {total[0] / 1000:.1f} ms (cumulative)\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+@app.cli.command("export-analytics")
+@click.option('--output-dir', default='analytics', show_default=True, help='Directory for the Parquet datasets.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows fetched and written per chunk.')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only tests completed on or after this date.')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), help='Only tests completed before this date.')
+@click.option('--mongo/--no-mongo', default=None, help='Include user_progress/user_performance (default: when MONGODB_URI is set).')
+def export_analytics_command(output_dir, chunk_size, since, until, mongo):
+    """Stream tests, attempts and questions into Parquet by subject and date, and snapshot Mongo progress."""
+    from analytics_export import export_analytics
+    if mongo is None:
+        mongo = bool(os.getenv('MONGODB_URI'))
+    try:
+        counts = export_analytics(output_dir, chunk_size, since, until, include_mongo=mongo)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for dataset, rows in counts.items():
+        print(f"{dataset:<12} {rows:>10} rows")
+    print(f"Exported to {output_dir}")
+
 CORS(app, supports_credentials=True)
+tracing.init_app(app)
 
 if __name__ == '__main__':
     # Load original questions on startup
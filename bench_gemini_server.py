@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini generateContent API, for offline benchmarks.
+
+Answers POST /v1beta/models/<model>:generateContent with a structured-output
+response shaped like Gemini's (candidates[0].content.parts[0].text holding a
+QuestionData JSON document) after a configurable latency, and can inject
+errors and malformed JSON. Point the app at it with GEMINI_BASE_URL:
+
+    python bench_gemini_server.py --port 8089 --latency lognormal --latency-ms 1500
+    GEMINI_BASE_URL=http://127.0.0.1:8089 GOOGLE_API_KEY=bench flask run
+
+bench_load_test.py starts one in-process automatically.
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+ERROR_STATUSES = (
+    (429, 'RESOURCE_EXHAUSTED', 'Resource has been exhausted (e.g. check quota).'),
+    (500, 'INTERNAL', 'An internal error has occurred.'),
+    (503, 'UNAVAILABLE', 'The model is overloaded. Please try again later.'),
+)
+GENERATE_PATH = re.compile(r'^/v1(?:beta)?/models/(?P<model>[^/:]+):generateContent$')
+
+
+class GeminiStandIn:
+    """Behaviour of the stand-in: latency model plus error and malformed-output rates."""
+
+    def __init__(self, latency='lognormal', latency_ms=1500.0, jitter_ms=500.0,
+                 error_rate=0.0, malformed_rate=0.0, seed=None):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counts = {'requests': 0, 'errors': 0, 'malformed': 0}
+
+    def sample_delay(self):
+        """Seconds to wait before answering."""
+        with self.rng_lock:
+            if self.latency == 'fixed':
+                ms = self.latency_ms
+            elif self.latency == 'uniform':
+                ms = self.rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.latency == 'normal':
+                ms = self.rng.gauss(self.latency_ms, self.jitter_ms)
+            else:
+                # Median latency_ms with a long right tail, like real model calls
+                sigma = self.jitter_ms / self.latency_ms if self.latency_ms else 0
+                ms = self.latency_ms * self.rng.lognormvariate(0, sigma)
+        return max(ms, 0) / 1000
+
+    def roll(self, rate):
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def choose(self, options):
+        with self.rng_lock:
+            return self.rng.choice(options)
+
+    def count(self, key):
+        with self.rng_lock:
+            self.counts[key] += 1
+
+    def question_json(self, prompt):
+        match = re.search(r'about (?P<topic>.+?) with difficulty (?P<difficulty>\w+)', prompt)
+        topic = match.group('topic') if match else 'the topic'
+        difficulty = match.group('difficulty') if match else 'medium'
+        with self.rng_lock:
+            correct = self.rng.choice('ABCD')
+            n = self.rng.randint(2, 99)
+        return json.dumps({
+            'question_text': f'[stand-in] A {difficulty} question on {topic}: what is {n} + {n}?',
+            'options': [{'id': letter, 'text': str(2 * n + (ord(letter) - ord(correct)))}
+                        for letter in 'ABCD'],
+            'correct_answer': correct,
+            'solution': f'Step 1: add {n} and {n}. Step 2: the sum is {2 * n}.',
+            'hint': 'Double the number.',
+            'concept': ['Main formula: a + a = 2a', 'Addition of equal numbers.', f'Example: {n} + {n} = {2 * n}'],
+            'difficulty': difficulty,
+        })
+
+
+def make_handler(stand_in):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            match = GENERATE_PATH.match(self.path.split('?', 1)[0])
+            if not match:
+                return self.send_json(404, {'error': {'code': 404, 'message': f'Unknown path {self.path}', 'status': 'NOT_FOUND'}})
+            try:
+                request = json.loads(body or b'{}')
+                prompt = ''.join(part.get('text', '')
+                                 for content in request.get('contents', [])
+                                 for part in content.get('parts', []))
+            except (ValueError, AttributeError):
+                return self.send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON payload', 'status': 'INVALID_ARGUMENT'}})
+
+            stand_in.count('requests')
+            time.sleep(stand_in.sample_delay())
+            if stand_in.roll(stand_in.error_rate):
+                stand_in.count('errors')
+                code, status, message = stand_in.choose(ERROR_STATUSES)
+                return self.send_json(code, {'error': {'code': code, 'message': message, 'status': status}})
+
+            text = stand_in.question_json(prompt)
+            if stand_in.roll(stand_in.malformed_rate):
+                stand_in.count('malformed')
+                text = text[:len(text) // 2]  # truncated mid-document, as with a cut-off generation
+            self.send_json(200, {
+                'candidates': [{
+                    'content': {'parts': [{'text': text}], 'role': 'model'},
+                    'finishReason': 'STOP',
+                    'index': 0,
+                }],
+                'usageMetadata': {
+                    'promptTokenCount': len(prompt) // 4,
+                    'candidatesTokenCount': len(text) // 4,
+                    'totalTokenCount': (len(prompt) + len(text)) // 4,
+                },
+                'modelVersion': match.group('model'),
+            })
+
+        def send_json(self, code, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(stand_in, host='127.0.0.1', port=0):
+    """Serve ``stand_in`` from a daemon thread; returns the server (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), make_handler(stand_in))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='gemini-stand-in', daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('Gemini stand-in')
+    group.add_argument('--latency', choices=LATENCY_DISTRIBUTIONS, default='lognormal',
+                       help='latency distribution of generateContent calls')
+    group.add_argument('--latency-ms', type=float, default=1500.0, help='mean (median for lognormal) latency')
+    group.add_argument('--jitter-ms', type=float, default=500.0,
+                       help='half-width (uniform) or standard deviation (normal, lognormal) of the latency')
+    group.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 429/500/503')
+    group.add_argument('--malformed-rate', type=float, default=0.0,
+                       help='fraction of calls returning truncated, unparseable JSON')
+    group.add_argument('--seed', type=int, help='random seed')
+
+
+def stand_in_from_args(args):
+    return GeminiStandIn(args.latency, args.latency_ms, args.jitter_ms,
+                         args.error_rate, args.malformed_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = start_server(stand_in_from_args(args), args.host, args.port)
+    print(f"Gemini stand-in listening on http://{args.host}:{server.server_port} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
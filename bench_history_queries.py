@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark the TestHistory / QuestionAttempt access paths with and without
+the composite indexes added in migration 3f1c2a9d8e41.
+
+Seeds a throwaway SQLite database (one million TestHistory rows by default),
+times the dashboard, results-page and submit-path queries with the indexes
+dropped, then recreates the indexes and times them again.
+
+    python bench_history_queries.py --rows 1000000 --users 5000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+INDEXES = {
+    'ix_test_history_user_id_completed_at':
+        'CREATE INDEX ix_test_history_user_id_completed_at ON test_history (user_id, completed_at DESC)',
+    'ix_question_attempt_test_id_id':
+        'CREATE INDEX ix_question_attempt_test_id_id ON question_attempt (test_id, id)',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='TestHistory rows to seed')
+    parser.add_argument('--users', type=int, default=5000, help='number of distinct users')
+    parser.add_argument('--attempts-per-test', type=int, default=1,
+                        help='QuestionAttempt rows seeded per test')
+    parser.add_argument('--repeat', type=int, default=50, help='timed runs per query')
+    parser.add_argument('--db', help='SQLite file to use (default: a temporary file)')
+    return parser.parse_args()
+
+
+def seed(db, TestHistory, QuestionAttempt, User, args):
+    from sqlalchemy import insert
+
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    batch = 50_000
+    print(f"Seeding {args.users} users, {args.rows} tests, "
+          f"{args.rows * args.attempts_per_test} question attempts...")
+    t0 = time.perf_counter()
+    db.session.execute(insert(User.__table__), [
+        {'id': uid, 'email': f'user{uid}@bench.local'} for uid in range(1, args.users + 1)
+    ])
+    attempt_id = 1
+    for offset in range(0, args.rows, batch):
+        tests, attempts = [], []
+        for test_id in range(offset + 1, min(offset + batch, args.rows) + 1):
+            tests.append({
+                'id': test_id,
+                # Skewed so that a handful of heavy users own a large share of history
+                'user_id': min(args.users, int(rng.paretovariate(1.2))),
+                'subject': rng.choice(('physics', 'chemistry', 'mathematics')),
+                'topic': 'Benchmark Topic',
+                'score': rng.randint(-5, 20),
+                'time_taken': rng.randint(60, 1200),
+                'completed_at': start + timedelta(seconds=rng.randint(0, 365 * 86400)),
+            })
+            for _ in range(args.attempts_per_test):
+                attempts.append({
+                    'id': attempt_id,
+                    'test_id': test_id,
+                    'question_text': 'q',
+                    'correct_answer': 'A',
+                    'difficulty': 'medium',
+                })
+                attempt_id += 1
+        db.session.execute(insert(TestHistory.__table__), tests)
+        if attempts:
+            db.session.execute(insert(QuestionAttempt.__table__), attempts)
+        db.session.commit()
+    print(f"Seeded in {time.perf_counter() - t0:.1f}s")
+
+
+def time_query(fn, repeat):
+    fn()  # warm the page cache
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def run_queries(db, TestHistory, QuestionAttempt, heavy_user_id, test_id, repeat):
+    queries = {
+        'dashboard: recent 5 for heavy user': lambda: (
+            TestHistory.query.filter_by(user_id=heavy_user_id)
+            .order_by(TestHistory.completed_at.desc()).limit(5).all()
+        ),
+        'results: attempts of one test': lambda: (
+            QuestionAttempt.query.filter_by(test_id=test_id).order_by(QuestionAttempt.id).all()
+        ),
+        'history count for heavy user': lambda: (
+            TestHistory.query.filter_by(user_id=heavy_user_id).count()
+        ),
+    }
+    results = {}
+    for name, fn in queries.items():
+        results[name] = time_query(fn, repeat)
+        db.session.rollback()
+    return results
+
+
+def explain(db, sql):
+    from sqlalchemy import text
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    return '; '.join(row[-1] for row in rows)
+
+
+def main():
+    args = parse_args()
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='jee_bench_'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import app, db, TestHistory, QuestionAttempt, User
+    from sqlalchemy import func, text
+
+    with app.app_context():
+        if not os.path.exists(db_path) or TestHistory.query.count() == 0:
+            db.create_all()
+            seed(db, TestHistory, QuestionAttempt, User, args)
+
+        heavy_user_id = (
+            db.session.query(TestHistory.user_id)
+            .group_by(TestHistory.user_id)
+            .order_by(func.count().desc()).limit(1).scalar()
+        )
+        heavy_count = TestHistory.query.filter_by(user_id=heavy_user_id).count()
+        test_id = db.session.query(func.max(TestHistory.id)).scalar() // 2
+        print(f"Heaviest user {heavy_user_id} has {heavy_count} tests; probing test {test_id}")
+
+        recent_sql = (f'SELECT * FROM test_history WHERE user_id = {heavy_user_id} '
+                      'ORDER BY completed_at DESC LIMIT 5')
+        results_sql = f'SELECT * FROM question_attempt WHERE test_id = {test_id} ORDER BY id'
+
+        timings = {}
+        for label, create in (('without indexes', False), ('with indexes', True)):
+            for name, ddl in INDEXES.items():
+                db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+                if create:
+                    db.session.execute(text(ddl))
+            db.session.commit()
+            db.session.execute(text('ANALYZE'))
+            print(f"\n[{label}]")
+            print(f"  plan (dashboard): {explain(db, recent_sql)}")
+            print(f"  plan (results):   {explain(db, results_sql)}")
+            timings[label] = run_queries(db, TestHistory, QuestionAttempt, heavy_user_id, test_id, args.repeat)
+
+        print(f"\n{'query':<40}{'no index p50':>14}{'indexed p50':>14}{'speedup':>10}")
+        for name in timings['with indexes']:
+            before = timings['without indexes'][name][0]
+            after = timings['with indexes'][name][0]
+            print(f"{name:<40}{before:>11.3f} ms{after:>11.3f} ms{before / max(after, 1e-6):>9.1f}x")
+
+    print(f"\nDatabase kept at {db_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end load test.
+
+Runs the app in-process on a threaded werkzeug server against the local data/
+directory (LOCAL_DATA_DIR) and a throwaway SQLite database, with Gemini replaced
+by the local stand-in from bench_gemini_server.py. Virtual users then run the
+student flow concurrently:
+
+    signup -> generate-test -> get-hint / get-solution per question -> submit-test
+
+and the script reports p50/p95/p99 latency and requests/s per endpoint.
+
+    python bench_load_test.py --concurrency 16 --flows 64 --latency-ms 800 --error-rate 0.05
+    python bench_load_test.py --gemini-url http://127.0.0.1:8089 --json bench_output.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_gemini_server import add_arguments, stand_in_from_args, start_server
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8, help='virtual users running flows at once')
+    parser.add_argument('--flows', type=int, default=32, help='total signup-to-submit flows to run')
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'data'), help='local copy of the bucket data')
+    parser.add_argument('--db', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--gemini-url', help='use an already running stand-in instead of starting one')
+    parser.add_argument('--gemini-timeout', type=float, default=30.0, help='GEMINI_TIMEOUT_SECONDS for the app')
+    parser.add_argument('--json', dest='json_path', help='also write the results as JSON to this file')
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point the app at local data, SQLite and the stand-in; must run before importing app."""
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='jee_load_'), 'load.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['LOCAL_DATA_DIR'] = args.data_dir
+    os.environ['GOOGLE_API_KEY'] = os.environ.get('GOOGLE_API_KEY') or 'bench'
+    os.environ['GEMINI_TIMEOUT_SECONDS'] = str(args.gemini_timeout)
+    stand_in = None
+    if args.gemini_url:
+        os.environ['GEMINI_BASE_URL'] = args.gemini_url
+    else:
+        stand_in = stand_in_from_args(args)
+        server = start_server(stand_in)
+        os.environ['GEMINI_BASE_URL'] = f'http://127.0.0.1:{server.server_port}'
+    return db_path, stand_in
+
+
+def start_app():
+    from werkzeug.serving import make_server
+    from app import app, db
+
+    with app.app_context():
+        db.create_all()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='app-server', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.fallbacks = 0
+
+    def call(self, session, endpoint, url, payload):
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json=payload, timeout=600)
+            ok = response.status_code < 400
+            body = response.json() if ok else None
+        except Exception:
+            ok, body = False, None
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if not ok:
+                self.failures[endpoint] += 1
+        return body
+
+
+def run_flow(base_url, flow_id, topics, recorder, rng):
+    import requests
+
+    session = requests.Session()
+    user = recorder.call(session, 'signup', f'{base_url}/signup', {
+        'email': f'load{flow_id}-{time.time_ns()}@bench.local',
+        'password': 'bench-password',
+        'full_name': f'Load User {flow_id}',
+    })
+    if not user:
+        return
+    subject, topic = rng.choice(topics)
+    test = recorder.call(session, 'generate-test', f'{base_url}/api/generate-test',
+                         {'subject': subject, 'topic': topic})
+    if not test:
+        return
+    answers = []
+    for question in test['questions']:
+        with recorder.lock:
+            # fallback_question() text; the API response does not flag fallbacks otherwise
+            if question['question_text'].startswith('Sample question about'):
+                recorder.fallbacks += 1
+        recorder.call(session, 'get-hint', f'{base_url}/api/get-hint', {'question_id': question['id']})
+        recorder.call(session, 'get-solution', f'{base_url}/api/get-solution', {'question_id': question['id']})
+        answers.append({'question_id': question['id'], 'answer': rng.choice('ABCD')})
+    recorder.call(session, 'submit-test', f'{base_url}/api/submit-test',
+                  {'test_id': test['test_id'], 'answers': answers, 'time_taken': rng.randint(60, 900)})
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, wall_seconds):
+    rows = {}
+    for endpoint, samples in recorder.latencies.items():
+        ordered = sorted(samples)
+        rows[endpoint] = {
+            'requests': len(ordered),
+            'failures': recorder.failures[endpoint],
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p95_ms': percentile(ordered, 95) * 1000,
+            'p99_ms': percentile(ordered, 99) * 1000,
+            'mean_ms': statistics.fmean(ordered) * 1000,
+            'req_per_s': len(ordered) / wall_seconds,
+        }
+    return rows
+
+
+def main():
+    args = parse_args()
+    db_path, stand_in = configure_environment(args)
+    base_url = start_app()
+
+    with open(os.path.join(args.data_dir, 'distributions', 'dist_topic.json'), encoding='utf-8') as f:
+        distribution = json.load(f)
+    # dist_topic.json keys subjects in lowercase ("mathematics"); the UI sends them capitalised
+    subject_names = {'mathematics': 'Mathematics', 'physics': 'Physics', 'chemistry': 'Chemistry'}
+    topics = [(subject_names.get(subject, subject), topic)
+              for subject, weights in distribution.items() for topic in weights]
+
+    print(f"App at {base_url}, Gemini stand-in at {os.environ['GEMINI_BASE_URL']}, database {db_path}")
+    print(f"Running {args.flows} flows with {args.concurrency} concurrent users...")
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        seeds = [rng.random() for _ in range(args.flows)]
+        futures = [pool.submit(run_flow, base_url, i, topics, recorder, random.Random(seeds[i]))
+                   for i in range(args.flows)]
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - start
+
+    rows = summarize(recorder, wall)
+    print(f"\n{'endpoint':<16}{'requests':>9}{'failed':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for endpoint in ('signup', 'generate-test', 'get-hint', 'get-solution', 'submit-test'):
+        if endpoint in rows:
+            r = rows[endpoint]
+            print(f"{endpoint:<16}{r['requests']:>9}{r['failures']:>8}{r['p50_ms']:>10.1f}"
+                  f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['req_per_s']:>9.2f}")
+    total = sum(r['requests'] for r in rows.values())
+    print(f"\n{total} requests in {wall:.1f}s ({total / wall:.2f} req/s, "
+          f"{args.flows / wall * 60:.1f} flows/min); {recorder.fallbacks} fallback questions served")
+    if stand_in is not None:
+        print(f"Gemini stand-in: {stand_in.counts}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'config': {k: v for k, v in vars(args).items() if k != 'json_path'},
+                'wall_seconds': wall,
+                'fallback_questions': recorder.fallbacks,
+                'gemini_stand_in': stand_in.counts if stand_in is not None else None,
+                'endpoints': rows,
+            }, f, indent=2)
+        print(f"Results written to {args.json_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
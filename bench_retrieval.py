@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Retrieval micro-benchmarks over the checked-in data/content MMD books.
+
+For every dist_topic.json topic, times the context-retrieval functions
+
+    app.get_mmd_content_for_topic            (served request path)
+    QuestionDatabase._parse_mmd_content      (generate_gemini_questions.py)
+    RAGEngine.search                         (rag_engine.py; needs rag_requirements.txt)
+
+and records latency (p50/p95 over --repeat runs), peak memory allocated
+(tracemalloc, one separate run) and a chapter hit: whether the returned span
+mentions at least two of the topic's signature terms below, i.e. whether it
+comes from the topic's chapter rather than an arbitrary part of the book.
+Functions whose dependencies are not installed are reported as skipped.
+
+Results are JSON so that a stored baseline can be compared on every change:
+
+    python bench_retrieval.py --output baseline.json
+    python bench_retrieval.py --baseline baseline.json --fail-on-regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BOOKS = {'mathematics': 'math', 'physics': 'physics', 'chemistry': 'chemistry'}
+MIN_TERMS_FOR_HIT = 2
+
+# Terms that identify each topic's chapter in the books (matched case-insensitively
+# as whole words, plurals included). Kept specific: generic words such as "force"
+# only count towards a hit together with a second term.
+SIGNATURE_TERMS = {
+    'mathematics': {
+        'Coordinate Geometry': ['slope', 'straight line', 'ellipse', 'parabola', 'hyperbola', 'intercept'],
+        'Limits, Continuity, and Differentiability': ['limit', 'continuous', 'differentiable', 'continuity'],
+        'Integral Calculus': ['integral', 'integration', 'antiderivative', 'integrand'],
+        'Complex Numbers and Quadratic Equations': ['complex number', 'conjugate', 'argand', 'modulus', 'quadratic'],
+        'Matrices and Determinants': ['matrix', 'matrices', 'determinant', 'transpose', 'minor', 'cofactor'],
+        'Statistics and Probability': ['probability', 'variance', 'standard deviation', 'mean deviation', 'sample space'],
+        'Three-Dimensional Geometry': ['three dimensional', 'direction cosines', 'coordinate planes', 'skew lines', 'octant'],
+        'Vector Algebra': ['vector product', 'scalar product', 'unit vector', 'collinear', 'position vector'],
+        'Sets, Relations, and Functions': ['subset', 'venn', 'relation', 'domain', 'codomain', 'empty set'],
+        'Permutations and Combinations': ['permutation', 'combination', 'counting', 'arrangement'],
+        'Binomial Theorem and Its Applications': ['binomial', 'pascal', 'expansion', 'binomial coefficient'],
+        'Sequences and Series': ['sequence', 'series', 'geometric progression', 'arithmetic progression', 'g.p'],
+        'Trigonometry': ['trigonometric', 'radian', 'sin', 'cos', 'tan'],
+        'Differential Equations': ['differential equation', 'general solution', 'particular solution', 'variable separable'],
+        'Statics and Dynamics': ['equilibrium', 'resultant', 'force', 'velocity', 'acceleration'],
+        'Differential Calculus': ['derivative', 'differentiation', 'rate of change', 'tangent', 'maxima'],
+    },
+    'physics': {
+        'Modern Physics': ['photoelectric', 'nucleus', 'photon', 'de broglie', 'radioactive', 'bohr'],
+        'Heat and Thermodynamics': ['heat', 'temperature', 'thermodynamics', 'specific heat', 'isothermal', 'entropy'],
+        'Optics': ['lens', 'mirror', 'refraction', 'focal length', 'interference', 'prism'],
+        'Current Electricity': ['current', 'resistance', 'ohm', 'resistivity', 'kirchhoff', 'potential difference'],
+        'Electrostatics': ['charge', 'electric field', 'coulomb', 'capacitor', 'gauss', 'electrostatic potential'],
+        'Magnetics': ['magnetic field', 'magnet', 'solenoid', 'ampere', 'biot', 'magnetic moment'],
+        'Unit, Dimension and Vector': ['dimensional formula', 'significant figure', 'si unit', 'dimension', 'base unit', 'vector'],
+        'Kinematics': ['velocity', 'displacement', 'acceleration', 'projectile', 'position'],
+        'Laws of Motion': ['inertia', 'newton', 'friction', 'momentum', 'force'],
+        'Work, Power and Energy': ['work done', 'kinetic energy', 'potential energy', 'power', 'work-energy theorem'],
+        'Centre of Mass, Impulse, and Momentum': ['centre of mass', 'impulse', 'momentum', 'collision', 'system of particles'],
+        'Rotation': ['torque', 'angular momentum', 'moment of inertia', 'rotational', 'angular velocity'],
+        'Gravitation': ['gravitation', 'kepler', 'orbit', 'escape speed', 'gravitational'],
+        'Simple Harmonic Motion': ['simple harmonic', 'oscillation', 'period', 'amplitude', 'pendulum'],
+        'Solids and Fluids': ['stress', 'strain', 'elastic', 'viscosity', 'pressure', 'surface tension'],
+        'Waves': ['wave', 'wavelength', 'frequency', 'sound', 'standing wave', 'beats'],
+        'Electromagnetics Induction; AC': ['induction', 'faraday', 'emf', 'inductance', 'alternating', 'lenz'],
+    },
+    'chemistry': {
+        'Transition Elements and Coordination Chemistry': ['transition', 'd-block', 'ligand', 'coordination', 'complex'],
+        'Periodic Table and Representative Elements': ['periodic table', 'ionization enthalpy', 'atomic radius', 'periodicity', 'electronegativity'],
+        'Thermodynamics and Gaseous State': ['enthalpy', 'internal energy', 'gas', 'entropy', 'ideal gas'],
+        'Atomic Structure': ['electron', 'orbital', 'quantum number', 'bohr', 'electronic configuration'],
+        'Chemical Bonding': ['bond', 'hybridisation', 'lewis', 'molecular orbital', 'covalent'],
+        'Chemical and Ionic Equilibrium': ['equilibrium', 'equilibrium constant', 'le chatelier', 'ionization', 'buffer'],
+        'Nuclear Chemistry and Environment': ['pollution', 'pollutant', 'ozone', 'environmental', 'radioactive'],
+        'Mole Concept': ['mole', 'molar mass', 'avogadro', 'stoichiometry', 'molarity'],
+        'Redox Reactions': ['oxidation', 'reduction', 'redox', 'oxidation number', 'electron transfer'],
+        'Electrochemistry': ['electrochemical', 'electrode', 'galvanic', 'electrolytic', 'conductivity', 'nernst'],
+        'Chemical Kinetics': ['rate of reaction', 'rate constant', 'rate law', 'activation energy', 'half-life'],
+        'Solutions and Colligative Properties': ['solution', 'colligative', 'raoult', 'osmotic', 'vapour pressure'],
+        'General Organic Chemistry': ['organic', 'carbocation', 'inductive effect', 'resonance', 'nucleophile'],
+        'Stereochemistry': ['isomer', 'chiral', 'enantiomer', 'optical', 'stereoisomer'],
+        'Hydrocarbons': ['alkane', 'alkene', 'alkyne', 'hydrocarbon', 'benzene'],
+        'Alkyl Halides': ['haloalkane', 'alkyl halide', 'halide', 'nucleophilic substitution', 'haloarene'],
+        'Carboxylic Acids and their Derivatives': ['carboxylic', 'ester', 'amide', 'anhydride', 'acyl'],
+        'Carbohydrates and Amino Acids': ['carbohydrate', 'glucose', 'amino acid', 'protein', 'sugar'],
+        'Aromatic Compounds': ['aromatic', 'benzene', 'phenol', 'electrophilic substitution', 'arene'],
+    },
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'data'), help='directory with content/ and distributions/')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per topic')
+    parser.add_argument('--top-k', type=int, default=3, help='RAGEngine.search results per query')
+    parser.add_argument('--only', choices=('mmd_window', 'parse_mmd', 'rag_search'), action='append',
+                        help='run only these benchmarks (repeatable)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative p50 slowdown (or memory growth) reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit 1 when a regression is found')
+    return parser.parse_args()
+
+
+def term_patterns(terms):
+    return [re.compile(r'\b' + re.escape(term) + r'(?:s|es)?\b', re.IGNORECASE) for term in terms]
+
+
+def chapter_hit(span, patterns):
+    """(hit, number of signature terms found) for a returned span."""
+    if not span:
+        return False, 0
+    found = sum(1 for pattern in patterns if pattern.search(span))
+    return found >= MIN_TERMS_FOR_HIT, found
+
+
+def measure(fn, repeat):
+    """Return (result, p50 ms, p95 ms, peak KiB) for calling ``fn``."""
+    result = fn()  # warm caches
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, round(0.95 * len(samples)) - 1)]
+    return result, statistics.median(samples), p95, peak / 1024
+
+
+def topic_result(span, repeat_stats, patterns):
+    _, p50, p95, peak_kib = repeat_stats
+    hit, terms = chapter_hit(span, patterns)
+    return {'p50_ms': round(p50, 4), 'p95_ms': round(p95, 4), 'peak_kib': round(peak_kib, 1),
+            'hit': hit, 'terms_found': terms, 'span_chars': len(span or '')}
+
+
+def bench_mmd_window(args, distribution, books):
+    os.environ['LOCAL_DATA_DIR'] = args.data_dir
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    import app
+
+    topics = {}
+    for subject, weights in distribution.items():
+        start = time.perf_counter()
+        app.load_mmd_content(subject)
+        load_ms = (time.perf_counter() - start) * 1000
+        for topic in weights:
+            stats = measure(lambda: app.get_mmd_content_for_topic(subject, topic), args.repeat)
+            topics[f'{subject}/{topic}'] = topic_result(stats[0], stats, SIGNATURE_TERMS[subject][topic])
+        topics[f'{subject}/(load)'] = {'load_ms': round(load_ms, 2)}
+    return topics
+
+
+def bench_parse_mmd(args, distribution, books):
+    from generate_gemini_questions import QuestionDatabase
+
+    topics = {}
+    for subject, weights in distribution.items():
+        # The parse is per book; each topic is then a lookup in its result
+        parse = lambda: QuestionDatabase._parse_mmd_content(books[subject])
+        parsed, p50, p95, peak_kib = measure(parse, max(1, args.repeat // 4))
+        topics[f'{subject}/(parse)'] = {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3),
+                                        'peak_kib': round(peak_kib, 1), 'sections': len(parsed)}
+        for topic in weights:
+            stats = measure(lambda: parsed.get(topic), args.repeat)
+            topics[f'{subject}/{topic}'] = topic_result(stats[0], stats, SIGNATURE_TERMS[subject][topic])
+    return topics
+
+
+def bench_rag_search(args, distribution, books):
+    import numpy as np
+    from rag_engine import RAGEngine
+
+    topics = {}
+    for subject, weights in distribution.items():
+        # Index the local book in memory instead of build_vector_db (which uploads to GCS)
+        engine = RAGEngine()
+        start = time.perf_counter()
+        engine.documents = engine._process_mmd_content(books[subject])
+        engine._create_index()
+        engine.index.add(np.array(engine.model.encode(engine.documents)).astype('float32'))
+        topics[f'{subject}/(index)'] = {'build_ms': round((time.perf_counter() - start) * 1000, 1),
+                                        'documents': len(engine.documents)}
+        for topic in weights:
+            stats = measure(lambda: engine.search(topic, k=args.top_k), args.repeat)
+            span = '\n\n'.join(document for document, _ in stats[0])
+            topics[f'{subject}/{topic}'] = topic_result(span, stats, SIGNATURE_TERMS[subject][topic])
+    return topics
+
+
+BENCHMARKS = {
+    'mmd_window': ('app.get_mmd_content_for_topic', bench_mmd_window),
+    'parse_mmd': ('QuestionDatabase._parse_mmd_content', bench_parse_mmd),
+    'rag_search': ('RAGEngine.search', bench_rag_search),
+}
+
+
+def summarize(topics):
+    rows = [r for name, r in topics.items() if 'hit' in r]
+    if not rows:
+        return {}
+    return {
+        'topics': len(rows),
+        'hit_rate': round(sum(r['hit'] for r in rows) / len(rows), 4),
+        'p50_ms': round(statistics.median(r['p50_ms'] for r in rows), 4),
+        'p95_ms': round(max(r['p95_ms'] for r in rows), 4),
+        'peak_kib': round(max(r['peak_kib'] for r in rows), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions against ``baseline``."""
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if current['status'] != 'ok' or not previous or previous['status'] != 'ok':
+            continue
+        now, before = current['summary'], previous['summary']
+        if now['hit_rate'] < before['hit_rate']:
+            regressions.append(f"{name}: hit rate {before['hit_rate']:.2%} -> {now['hit_rate']:.2%}")
+        for key in ('p50_ms', 'peak_kib'):
+            if before[key] and now[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {before[key]} -> {now[key]}")
+        for topic, row in current['topics'].items():
+            old = previous['topics'].get(topic)
+            if old and old.get('hit') and not row.get('hit'):
+                regressions.append(f"{name}: {topic} no longer hits its chapter")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, ROOT)
+    with open(os.path.join(args.data_dir, 'distributions', 'dist_topic.json'), encoding='utf-8') as f:
+        distribution = json.load(f)
+    books = {}
+    for subject, book in BOOKS.items():
+        with open(os.path.join(args.data_dir, 'content', f'{book}.mmd'), encoding='utf-8') as f:
+            books[subject] = f.read()
+    for subject, terms in SIGNATURE_TERMS.items():
+        for topic in terms:
+            terms[topic] = term_patterns(terms[topic])
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'repeat': args.repeat,
+            'corpus_chars': {subject: len(text) for subject, text in books.items()},
+            'min_terms_for_hit': MIN_TERMS_FOR_HIT,
+        },
+        'benchmarks': {},
+    }
+    for name, (target, bench) in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        try:
+            topics = bench(args, distribution, books)
+        except (ImportError, OSError) as e:
+            # OSError: generate_gemini_questions needs the GCS service account file at import
+            results['benchmarks'][name] = {'target': target, 'status': 'skipped', 'reason': str(e)}
+            print(f"{name:<12} {target:<38} skipped ({e})")
+            continue
+        summary = summarize(topics)
+        results['benchmarks'][name] = {'target': target, 'status': 'ok', 'summary': summary, 'topics': topics}
+        print(f"{name:<12} {target:<38} hit rate {summary['hit_rate']:>7.1%}  "
+              f"p50 {summary['p50_ms']:>9.4f} ms  p95 {summary['p95_ms']:>9.4f} ms  "
+              f"peak {summary['peak_kib']:>9.1f} KiB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print(f"No regressions against {args.baseline}")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
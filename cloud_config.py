@@ -1,7 +1,7 @@
 from google.cloud import storage
 from google.oauth2 import service_account
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import requests
 
 # Initialize Google Cloud Storage client
@@ -62,6 +62,15 @@ class CloudStorage:
             print(f"Error fetching binary from {path}: {e}")
             return b""
 
+    def get_generation(self, path: str) -> Optional[int]:
+        """Fetch a blob's generation, which changes whenever the object is overwritten."""
+        try:
+            blob = self.bucket.get_blob(path)
+            return blob.generation if blob else None
+        except Exception as e:
+            print(f"Error fetching metadata for {path}: {e}")
+            return None
+
     def upload_file(self, source_file: str, destination_blob_name: str):
         """Upload a file to Google Cloud Storage."""
         try:
@@ -1,5 +1,11 @@
-from pymongo import MongoClient
-from typing import Dict, Any
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+try:
+    from pymongo.errors import ClientBulkWriteException
+except ImportError:  # pymongo < 4.9 has no MongoClient.bulk_write
+    ClientBulkWriteException = None
+from typing import Dict, Any, List, Tuple
+from collections import defaultdict
 import os
 from dotenv import load_dotenv
 from datetime import datetime
@@ -10,6 +16,109 @@ load_dotenv()
 # MongoDB Atlas connection string (store in .env file)
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb+srv://your-connection-string')
 
+# Topic and concept names become field names. MongoDB field names may not contain
+# '.' (a path separator) or start with '$', so both are stored as full-width lookalikes.
+KEY_ESCAPES = {'.': '\uff0e', '$': '\uff04'}
+KEY_UNESCAPES = {v: k for k, v in KEY_ESCAPES.items()}
+
+def escape_key(key: str) -> str:
+    return ''.join(KEY_ESCAPES.get(ch, ch) for ch in key)
+
+def unescape_key(key: str) -> str:
+    return ''.join(KEY_UNESCAPES.get(ch, ch) for ch in key)
+
+def unescape_document(value):
+    """Undo escape_key on every key of a document read back from MongoDB."""
+    if isinstance(value, dict):
+        return {unescape_key(k) if isinstance(k, str) else k: unescape_document(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [unescape_document(v) for v in value]
+    return value
+
+# Recent apply_user_updates tokens stored on each progress/performance document,
+# so a retried flush does not apply the same $inc and $push twice
+APPLIED_FLUSHES_FIELD = '_applied_flushes'
+APPLIED_FLUSHES_KEPT = 20
+DUPLICATE_KEY_ERROR = 11000
+
+class UpdateBuilder:
+    """Accumulates targeted update operators ($inc, $set, $unset, $push with $slice) for one document.
+
+    Repeated operations on the same field are merged, so several answers can be
+    folded into a single update. Paths are built with path(), which escapes each part.
+    """
+
+    def __init__(self):
+        self._inc = defaultdict(int)
+        self._set = {}
+        self._unset = set()
+        self._push = {}
+        self._defaults = None
+
+    @staticmethod
+    def path(*parts) -> str:
+        return '.'.join(escape_key(str(part)) for part in parts)
+
+    def inc(self, path: str, amount=1):
+        self._inc[path] += amount
+        return self
+
+    def set(self, path: str, value):
+        self._set[path] = value
+        return self
+
+    def unset(self, path: str):
+        self._unset.add(path)
+        return self
+
+    def push(self, path: str, value, keep_last: int = None):
+        """Append to an array, keeping only its last ``keep_last`` elements."""
+        push = self._push.setdefault(path, {'$each': []})
+        push['$each'].append(value)
+        if keep_last:
+            push['$slice'] = -keep_last
+        return self
+
+    def set_on_insert(self, document: Dict[str, Any]):
+        """Default fields for a new document, skipping any path another operator writes."""
+        self._defaults = document
+        return self
+
+    @classmethod
+    def _flatten_defaults(cls, document, prefix, touched, out):
+        # MongoDB rejects an update whose paths overlap, so descend into any default
+        # that contains a written field and only keep the untouched siblings
+        for key, value in document.items():
+            path = f'{prefix}{escape_key(key)}'
+            if path in touched:
+                continue
+            if any(t.startswith(path + '.') for t in touched):
+                if isinstance(value, dict):
+                    cls._flatten_defaults(value, path + '.', touched, out)
+                continue
+            out[path] = value
+        return out
+
+    def to_update(self) -> Dict[str, Any]:
+        update = {}
+        if self._inc:
+            update['$inc'] = dict(self._inc)
+        if self._set:
+            update['$set'] = dict(self._set)
+        if self._unset:
+            update['$unset'] = {path: '' for path in sorted(self._unset)}
+        if self._push:
+            update['$push'] = {path: dict(push) for path, push in self._push.items()}
+        if self._defaults:
+            touched = set(self._inc) | set(self._set) | self._unset | set(self._push)
+            set_on_insert = self._flatten_defaults(self._defaults, '', touched, {})
+            if set_on_insert:
+                update['$setOnInsert'] = set_on_insert
+        return update
+
+    def __bool__(self):
+        return bool(self._inc or self._set or self._unset or self._push)
+
 class MongoDB:
     def __init__(self):
         self.client = MongoClient(MONGODB_URI)
@@ -17,11 +126,37 @@ class MongoDB:
         self.progress_collection = self.db['user_progress']
         self.performance_collection = self.db['user_performance']
         self.generated_questions_collection = self.db['generated_questions']
+        # One document per (user_id, subject, topic) with next_review as a native datetime
+        self.review_schedule_collection = self.db['review_schedule']
+        # Per-day review queues built by review_schedule.materialize_queues, and its checkpoints
+        self.review_queues_collection = self.db['review_queues']
+        self.review_runs_collection = self.db['review_runs']
+        self._client_bulk_write = None
+        self._review_indexes_ready = False
+
+    def _ensure_review_indexes(self) -> None:
+        if not self._review_indexes_ready:
+            self.review_schedule_collection.create_index(
+                [('user_id', ASCENDING), ('subject', ASCENDING), ('topic', ASCENDING)], unique=True)
+            self.review_schedule_collection.create_index([('user_id', ASCENDING), ('next_review', ASCENDING)])
+            # Cross-user scans in due order, resumable from a (next_review, _id) position
+            self.review_schedule_collection.create_index([('next_review', ASCENDING), ('_id', ASCENDING)])
+            self._review_indexes_ready = True
+
+    def _supports_client_bulk_write(self) -> bool:
+        """MongoClient.bulk_write spans collections; it needs pymongo 4.9+ and MongoDB 8.0+."""
+        if self._client_bulk_write is None:
+            supported = hasattr(self.client, 'bulk_write')
+            if supported:
+                version = self.client.server_info().get('versionArray', [0])
+                supported = version[0] >= 8
+            self._client_bulk_write = supported
+        return self._client_bulk_write
 
     def get_user_progress(self, user_id: str) -> Dict[str, Any]:
         """Get user progress data from MongoDB."""
-        doc = self.progress_collection.find_one({'_id': user_id})
-        return doc if doc else {}
+        doc = self.progress_collection.find_one({'_id': user_id}, {APPLIED_FLUSHES_FIELD: 0})
+        return unescape_document(doc) if doc else {}
 
     def save_user_progress(self, user_id: str, data: Dict[str, Any]) -> None:
         """Save user progress data to MongoDB."""
@@ -33,8 +168,8 @@ class MongoDB:
 
     def get_user_performance(self, user_id: str) -> Dict[str, Any]:
         """Get user performance data from MongoDB."""
-        doc = self.performance_collection.find_one({'_id': user_id})
-        return doc if doc else {}
+        doc = self.performance_collection.find_one({'_id': user_id}, {APPLIED_FLUSHES_FIELD: 0})
+        return unescape_document(doc) if doc else {}
 
     def save_user_performance(self, user_id: str, data: Dict[str, Any]) -> None:
         """Save user performance data to MongoDB."""
@@ -44,6 +179,135 @@ class MongoDB:
             upsert=True
         )
 
+    def get_review_schedule(self, user_id: str, until: datetime) -> List[Dict[str, Any]]:
+        """A user's review schedule entries with next_review up to ``until``, soonest first."""
+        self._ensure_review_indexes()
+        return list(self.review_schedule_collection.find(
+            {'user_id': user_id, 'next_review': {'$lte': until}},
+            {'_id': 0, 'subject': 1, 'topic': 1, 'next_review': 1}
+        ).sort('next_review', ASCENDING))
+
+    def stream_due_reviews(self, query: Dict[str, Any], batch_size: int):
+        """Cursor over review schedule entries matching ``query`` in (next_review, _id) order."""
+        self._ensure_review_indexes()
+        return self.review_schedule_collection.find(query).sort(
+            [('next_review', ASCENDING), ('_id', ASCENDING)]).batch_size(batch_size)
+
+    def add_to_review_queues(self, run: str, items: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Add queue items per user to the run's review queues.
+
+        A queue's items are a map keyed by 'subject|topic', so adding a topic again,
+        even with a different next_review or priority, replaces its item.
+        """
+        self.review_queues_collection.bulk_write([
+            UpdateOne({'_id': f"{run}:{user_id}"},
+                      {'$set': {UpdateBuilder.path('items', f"{item['subject']}|{item['topic']}"): item
+                                for item in user_items},
+                       '$setOnInsert': {'run': run, 'user_id': user_id}},
+                      upsert=True)
+            for user_id, user_items in items.items()
+        ], ordered=False)
+
+    def review_queue_demand(self, run: str) -> List[Dict[str, Any]]:
+        """Number of users with each (subject, topic) in the run's review queues, most wanted first."""
+        return [
+            {'subject': row['_id']['subject'], 'topic': row['_id']['topic'], 'users': row['users']}
+            for row in self.review_queues_collection.aggregate([
+                {'$match': {'run': run}},
+                {'$project': {'items': {'$objectToArray': '$items'}}},
+                {'$unwind': '$items'},
+                {'$group': {'_id': {'subject': '$items.v.subject', 'topic': '$items.v.topic'},
+                            'users': {'$sum': 1}}},
+                {'$sort': {'users': -1, '_id.subject': 1, '_id.topic': 1}},
+            ])
+        ]
+
+    def clear_review_run(self, run: str) -> None:
+        """Forget a run's queues and checkpoint so it is rebuilt from scratch."""
+        self.review_queues_collection.delete_many({'run': run})
+        self.review_runs_collection.delete_one({'_id': run})
+
+    def apply_user_updates(self, user_id: str, progress: UpdateBuilder, performance: UpdateBuilder,
+                           reviews: Dict[Tuple[str, str], Dict[str, Any]] = None, token: str = None) -> None:
+        """Apply a user's progress, performance and review schedule updates in a single unordered bulk write.
+
+        ``reviews`` maps (subject, topic) to the schedule fields to set for that topic.
+
+        The write can partly succeed, so a caller that retries the same updates passes a
+        ``token`` unique to them: it is recorded on the progress and performance
+        documents, and an update whose token is already there matches nothing. Its upsert
+        then collides with the existing _id; see _settle_collision. Review updates only
+        $set and can be repeated as they are.
+        """
+        writes = []
+        for collection, update in ((self.progress_collection, progress),
+                                   (self.performance_collection, performance)):
+            if not update:
+                continue
+            query, document = {'_id': user_id}, update.to_update()
+            if token:
+                query[APPLIED_FLUSHES_FIELD] = {'$ne': token}
+                document.setdefault('$push', {})[APPLIED_FLUSHES_FIELD] = {
+                    '$each': [token], '$slice': -APPLIED_FLUSHES_KEPT}
+            writes.append((collection, query, document))
+        guarded = {collection.name for collection, _, _ in writes} if token else set()
+        if reviews:
+            self._ensure_review_indexes()
+            writes.extend((self.review_schedule_collection,
+                           {'user_id': user_id, 'subject': subject, 'topic': topic},
+                           {'$set': fields})
+                          for (subject, topic), fields in reviews.items())
+        if not writes:
+            return
+        collisions = []
+        if self._supports_client_bulk_write():
+            try:
+                self.client.bulk_write(
+                    [UpdateOne(query, update, upsert=True, namespace=collection.full_name)
+                     for collection, query, update in writes],
+                    ordered=False
+                )
+            except ClientBulkWriteException as e:
+                if e.error is not None or e.write_concern_errors or not all(
+                        _is_guarded_collision(error, writes[error['idx']][0].name in guarded)
+                        for error in e.write_errors):
+                    raise
+                collisions = [writes[error['idx']] for error in e.write_errors]
+        else:
+            # Older drivers and servers: one bulk write per collection
+            collections, operations = {}, defaultdict(list)
+            for collection, query, update in writes:
+                collections[collection.name] = collection
+                operations[collection.name].append(UpdateOne(query, update, upsert=True))
+            for name, collection_operations in operations.items():
+                try:
+                    collections[name].bulk_write(collection_operations, ordered=False)
+                except BulkWriteError as e:
+                    if e.details.get('writeConcernErrors') or not all(
+                            _is_guarded_collision(error, name in guarded) for error in e.details['writeErrors']):
+                        raise
+                    # Guarded collections get exactly one operation each
+                    collisions.extend(write for write in writes if write[0].name == name)
+        for collection, query, update in collisions:
+            self._settle_collision(collection, query, update, token)
+
+    def _settle_collision(self, collection, query, update, token, attempts=3) -> None:
+        """Finish a token-guarded upsert that failed with a duplicate _id.
+
+        Either an earlier attempt already applied it, and its token is on the document,
+        or another writer inserted the document first; then the update is sent again
+        and now matches that document.
+        """
+        for attempt in range(attempts):
+            if collection.find_one({'_id': query['_id'], APPLIED_FLUSHES_FIELD: token}, {'_id': 1}):
+                return
+            try:
+                collection.update_one(query, update, upsert=True)
+                return
+            except DuplicateKeyError:
+                if attempt == attempts - 1:
+                    raise
+
     def save_generated_questions(self, user_id: str, questions: list) -> None:
         """Save generated questions to MongoDB."""
         doc = {
@@ -54,5 +318,9 @@ class MongoDB:
         }
         self.generated_questions_collection.insert_one(doc)
 
+def _is_guarded_collision(error: Dict[str, Any], guarded: bool) -> bool:
+    # A token-guarded upsert that matches nothing tries to insert a second document with the same _id
+    return guarded and error.get('code') == DUPLICATE_KEY_ERROR
+
 # Initialize MongoDB connection
 mongodb = MongoDB() 
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""Gemini call limits shared by the web app and the question generators."""
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Gemini call budget. A test is generated question by question, so a full
+# /api/generate-test can take up to QUESTIONS_PER_TEST * GEMINI_TIMEOUT_SECONDS;
+# gunicorn.conf.py sizes the worker timeout from these settings.
+GEMINI_TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '30'))
+QUESTION_DIFFICULTIES = ['easy', 'medium', 'hard', 'medium', 'easy']
+QUESTIONS_PER_TEST = len(QUESTION_DIFFICULTIES)
+
+# Concurrent Gemini calls per process. app.py and generate_gemini_questions.py
+# each run a pool of this size.
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '64'))
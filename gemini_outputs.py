@@ -0,0 +1,78 @@
+"""Fixed-size ring buffer of recent raw Gemini outputs, for /api/debug-gemini-output.
+
+Each worker process keeps its own buffer. Outputs are stored once, zlib-compressed,
+next to their metadata (subject, topic, difficulty, latency, parse status, request
+ID); the oldest entry is overwritten when the buffer is full.
+"""
+import threading
+import time
+import zlib
+
+
+class RawOutput:
+    __slots__ = ('id', 'created_at', 'metadata', 'compressed', 'size')
+
+    def __init__(self, id, metadata, text):
+        self.id = id
+        self.created_at = time.time()
+        self.metadata = metadata
+        self.compressed = zlib.compress(text.encode('utf-8'))
+        self.size = len(text)
+
+    @property
+    def text(self):
+        return zlib.decompress(self.compressed).decode('utf-8')
+
+    def to_dict(self, include_text=False):
+        entry = {
+            'id': self.id,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.created_at)),
+            'chars': self.size,
+            'compressed_bytes': len(self.compressed),
+            **self.metadata,
+        }
+        if include_text:
+            entry['text'] = self.text
+        return entry
+
+
+class RawOutputRing:
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._slots = [None] * self.capacity
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def record(self, text, **metadata):
+        """Store ``text`` with ``metadata``; returns the entry ID."""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            # Compressing under the lock keeps IDs and slots in order; outputs are a few KB
+            self._slots[entry_id % self.capacity] = RawOutput(entry_id, metadata, text)
+        return entry_id
+
+    def get(self, entry_id):
+        slot = self._slots[entry_id % self.capacity]
+        return slot if slot is not None and slot.id == entry_id else None
+
+    def entries(self, limit=None, **filters):
+        """Newest first, keeping entries whose metadata matches every filter given."""
+        with self._lock:
+            snapshot = [slot for slot in self._slots if slot is not None]
+        snapshot.sort(key=lambda slot: slot.id, reverse=True)
+        matching = [slot for slot in snapshot
+                    if all(value is None or slot.metadata.get(key) == value for key, value in filters.items())]
+        return matching[:limit] if limit else matching
+
+    def stats(self):
+        with self._lock:
+            slots = [slot for slot in self._slots if slot is not None]
+            total = self._next_id - 1
+        return {
+            'capacity': self.capacity,
+            'stored': len(slots),
+            'recorded_total': total,
+            'chars': sum(slot.size for slot in slots),
+            'compressed_bytes': sum(len(slot.compressed) for slot in slots),
+        }
@@ -1,19 +1,30 @@
 import json
+import logging
 import random
 import google.generativeai as genai
 from typing import Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import numpy as np
 import re
+import threading
 import time
-from cloud_config import cloud_storage
-from db_config import mongodb
+from concurrent.futures import ThreadPoolExecutor
+from cloud_config import cloud_storage, STORAGE_PATHS
+from gemini_config import GEMINI_MAX_CONCURRENCY
+from db_config import mongodb, UpdateBuilder
+from progress_cache import progress_cache
+from review_schedule import review_interval_days
+from progress_stats import WINDOW, WindowedStats
+import logging_setup
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+raw_output_logger = logging.getLogger(logging_setup.RAW_OUTPUT_LOGGER)
+
 # Configure Gemini API
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 genai.configure(api_key=GOOGLE_API_KEY)
@@ -21,6 +32,9 @@ genai.configure(api_key=GOOGLE_API_KEY)
 # Initialize Gemini Flash model
 model = genai.GenerativeModel('gemini-pro')
 
+# Bounded pool for Gemini calls, shared by every generate_personalized_questions call
+gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix='gemini')
+
 # Constants for question type distribution
 MCQ_PROBABILITY = 0.8  # 80% MCQ questions
 NUMERICAL_PROBABILITY = 0.2  # 20% Numerical questions
@@ -34,25 +48,28 @@ MASTERY_LEVELS = {
     4: "Master"
 }
 
-# Constants for spaced repetition intervals (in days)
-SPACED_REPETITION_INTERVALS = {
-    1: 1,    # Level 1: Review next day
-    2: 3,    # Level 2: Review after 3 days
-    3: 7,    # Level 3: Review after a week
-    4: 14,   # Level 4: Review after two weeks
-    5: 30    # Level 5: Review after a month
-}
-
 # Constants for performance thresholds
 TIME_THRESHOLD = 300  # 5 minutes in seconds
 ACCURACY_THRESHOLD = 0.6  # 60% accuracy threshold
 CONCEPT_REINFORCEMENT_THRESHOLD = 0.4  # 40% accuracy triggers concept reinforcement
 
+# How often QuestionDatabase asks GCS whether a loaded source has been replaced
+QUESTION_DB_CHECK_SECONDS = float(os.getenv('QUESTION_DB_CHECK_SECONDS', '300'))
+
 class UserProgress:
     def __init__(self, user_id: str):
         self.user_id = user_id
-        self.progress_data = self._load_progress_data()
-        self.performance_data = self._load_performance_data()
+        # Shared with every UserProgress for this user in the worker; see progress_cache
+        self._cached = progress_cache.get(user_id, self._load_user_data)
+
+    # Read through the cache entry, which progress_cache may reload between answers
+    @property
+    def progress_data(self) -> Dict:
+        return self._cached.progress
+
+    @property
+    def performance_data(self) -> Dict:
+        return self._cached.performance
 
     def _initialize_topic_progress(self) -> Dict:
         """Initialize progress data for a new topic."""
@@ -65,29 +82,15 @@ class UserProgress:
             "correct_attempts": 0,
             "average_time": 0,
             "consecutive_correct": 0,
-            "consecutive_incorrect": 0,
-            "last_5_times": [],  # Store last 5 completion times
-            "last_5_accuracy": []  # Store last 5 accuracy scores
+            "consecutive_incorrect": 0
         }
 
     def _initialize_performance_data(self) -> Dict:
-        """Initialize performance tracking data."""
+        """Initialize performance tracking data, in its stored form."""
         return {
             "question_types": {
-                "mcq": {
-                    "total_attempts": 0,
-                    "correct_attempts": 0,
-                    "average_time": 0,
-                    "last_5_times": [],
-                    "last_5_accuracy": []
-                },
-                "numerical": {
-                    "total_attempts": 0,
-                    "correct_attempts": 0,
-                    "average_time": 0,
-                    "last_5_times": [],
-                    "last_5_accuracy": []
-                }
+                "mcq": WindowedStats().to_document(),
+                "numerical": WindowedStats().to_document()
             },
             "topics": {
                 "mathematics": {},
@@ -97,64 +100,112 @@ class UserProgress:
             "concepts": {}  # Track concept mastery
         }
 
+    def _initialize_progress_data(self) -> Dict:
+        """Initialize progress data for a new user."""
+        return {
+            "subjects": {
+                "mathematics": {},
+                "physics": {},
+                "chemistry": {}
+            },
+            "last_session": None,
+            "streak_days": 0,
+            "total_questions_attempted": 0,
+            "total_correct_answers": 0
+        }
+
     def _load_progress_data(self) -> Dict:
         """Load user's progress data from MongoDB."""
         data = mongodb.get_user_progress(self.user_id)
         if not data:
-            # Initialize new progress data structure
-            return {
-                "subjects": {
-                    "mathematics": {},
-                    "physics": {},
-                    "chemistry": {}
-                },
-                "last_session": None,
-                "streak_days": 0,
-                "total_questions_attempted": 0,
-                "total_correct_answers": 0
-            }
+            return self._initialize_progress_data()
         return data
 
     def _load_performance_data(self) -> Dict:
-        """Load user's performance data from MongoDB."""
-        data = mongodb.get_user_performance(self.user_id)
-        if not data:
-            return self._initialize_performance_data()
+        """Load user's performance data from MongoDB, with WindowedStats for types and topics."""
+        data = mongodb.get_user_performance(self.user_id) or self._initialize_performance_data()
+        data["question_types"] = {q_type: WindowedStats.from_document(stats)
+                                  for q_type, stats in data["question_types"].items()}
+        data["topics"] = {subject: {topic: WindowedStats.from_document(stats) for topic, stats in topics.items()}
+                          for subject, topics in data["topics"].items()}
         return data
 
+    def _load_user_data(self) -> Tuple[Dict, Dict]:
+        return self._load_progress_data(), self._load_performance_data()
+
     def update_progress(self, subject: str, topic: str, is_correct: bool, time_taken: float):
         """Update user's progress after answering a question."""
+        with progress_cache.updating(self._cached) as pending:
+            pending.progress.set_on_insert(self._initialize_progress_data())
+            self._apply_progress(pending, subject, topic, is_correct, time_taken)
+
+    def _apply_progress(self, pending, subject: str, topic: str, is_correct: bool, time_taken: float):
+        """Apply one answer to the in-memory progress and record the matching Mongo writes."""
+        update = pending.progress
+        path = lambda *fields: UpdateBuilder.path("subjects", subject, topic, *fields)
         if topic not in self.progress_data["subjects"][subject]:
             self.progress_data["subjects"][subject][topic] = self._initialize_topic_progress()
+            # A field no answer touches still needs to exist in the stored topic
+            update.set(path("correct_streak"), 0)
         
         topic_data = self.progress_data["subjects"][subject][topic]
         
         # Update basic stats
         topic_data["total_attempts"] += 1
+        update.inc(path("total_attempts"))
+        # Incremented by 0 for a wrong answer so a new topic stores every field
+        topic_data["correct_attempts"] += int(is_correct)
+        update.inc(path("correct_attempts"), int(is_correct))
         if is_correct:
-            topic_data["correct_attempts"] += 1
             topic_data["consecutive_correct"] += 1
             topic_data["consecutive_incorrect"] = 0
         else:
             topic_data["consecutive_correct"] = 0
             topic_data["consecutive_incorrect"] += 1
+        update.set(path("consecutive_correct"), topic_data["consecutive_correct"])
+        update.set(path("consecutive_incorrect"), topic_data["consecutive_incorrect"])
         
         # Update average time
         topic_data["average_time"] = (topic_data["average_time"] * (topic_data["total_attempts"] - 1) + 
                                     time_taken) / topic_data["total_attempts"]
+        update.set(path("average_time"), topic_data["average_time"])
         
         # Update mastery level based on performance
         self._update_mastery_level(topic_data)
+        update.set(path("mastery_level"), topic_data["mastery_level"])
         
         # Update next review date based on spaced repetition
-        self._update_review_schedule(topic_data)
+        next_review = self._update_review_schedule(topic_data)
+        update.set(path("last_review"), topic_data["last_review"])
+        update.set(path("next_review"), topic_data["next_review"])
+        pending.reviews[(subject, topic)] = {
+            "next_review": next_review,
+            "mastery_level": topic_data["mastery_level"]
+        }
+        self._cached.reviews.schedule(subject, topic, next_review)
         
         # Update global stats
         self.progress_data["total_questions_attempted"] += 1
-        if is_correct:
-            self.progress_data["total_correct_answers"] += 1
-        
-        self._save_progress_data()
+        update.inc("total_questions_attempted")
+        self.progress_data["total_correct_answers"] += int(is_correct)
+        update.inc("total_correct_answers", int(is_correct))
+
+    def record_test(self, answers: List[Dict]):
+        """Update progress and performance for every answer of a submitted test at once.
+
+        Each answer is a dict with subject, topic, question_type, is_correct,
+        time_taken and concepts. All deltas are folded into one pending update
+        per collection, which progress_cache writes in a single bulk write.
+        """
+        with progress_cache.updating(self._cached) as pending:
+            pending.progress.set_on_insert(self._initialize_progress_data())
+            pending.performance.set_on_insert(self._initialize_performance_data())
+            for answer in answers:
+                self._apply_progress(pending, answer["subject"], answer["topic"],
+                                     answer["is_correct"], answer["time_taken"])
+                self._apply_performance(pending.performance, answer["subject"], answer["topic"],
+                                        answer["question_type"], answer["is_correct"],
+                                        answer["time_taken"], answer.get("concepts", []))
 
     def _update_mastery_level(self, topic_data: Dict):
         """Update mastery level based on performance metrics."""
@@ -169,27 +220,18 @@ class UserProgress:
             elif (accuracy < 0.6 and topic_data["consecutive_incorrect"] >= 3):
                 topic_data["mastery_level"] = max(0, current_level - 1)
 
-    def _update_review_schedule(self, topic_data: Dict):
-        """Update next review date based on spaced repetition."""
-        current_level = topic_data["mastery_level"]
-        days_to_add = SPACED_REPETITION_INTERVALS.get(current_level + 1, 30)
+    def _update_review_schedule(self, topic_data: Dict) -> datetime:
+        """Update next review date based on spaced repetition; returns it as a UTC datetime."""
+        days_to_add = review_interval_days(topic_data["mastery_level"])
         
         topic_data["last_review"] = datetime.now().isoformat()
         topic_data["next_review"] = (datetime.now() + timedelta(days=days_to_add)).isoformat()
+        return datetime.now(timezone.utc) + timedelta(days=days_to_add)
 
     def get_topics_for_review(self) -> List[Tuple[str, str]]:
-        """Get topics that are due for review."""
-        topics_for_review = []
-        current_time = datetime.now()
-        
-        for subject, topics in self.progress_data["subjects"].items():
-            for topic, data in topics.items():
-                if data["next_review"]:
-                    next_review = datetime.fromisoformat(data["next_review"])
-                    if next_review <= current_time:
-                        topics_for_review.append((subject, topic))
-        
-        return topics_for_review
+        """Get topics that are due for review, most overdue first."""
+        with self._cached.lock:
+            return self._cached.reviews.due()
 
     def get_weak_topics(self, min_attempts: int = 5) -> List[Tuple[str, str]]:
         """Get topics where user is struggling."""
@@ -204,57 +246,39 @@ class UserProgress:
         
         return weak_topics
 
-    def _save_progress_data(self):
-        """Save user's progress data to MongoDB."""
-        mongodb.save_user_progress(self.user_id, self.progress_data)
-
     def update_performance(self, subject: str, topic: str, question_type: str, 
                           is_correct: bool, time_taken: float, concepts: List[str]):
         """Update user's performance metrics."""
+        with progress_cache.updating(self._cached) as pending:
+            pending.performance.set_on_insert(self._initialize_performance_data())
+            self._apply_performance(pending.performance, subject, topic, question_type,
+                                    is_correct, time_taken, concepts)
+
+    def _apply_windowed_stats(self, update: UpdateBuilder, path: Tuple[str, ...], stats: WindowedStats,
+                              is_correct: bool, time_taken: float):
+        """Count an answer in a stats record and mirror it onto the stored document."""
+        accuracy = stats.record(is_correct, time_taken)
+        update.inc(UpdateBuilder.path(*path, "total_attempts"))
+        update.inc(UpdateBuilder.path(*path, "correct_attempts"), int(is_correct))
+        update.push(UpdateBuilder.path(*path, "last_5_times"), time_taken, keep_last=WINDOW)
+        update.push(UpdateBuilder.path(*path, "last_5_accuracy"), accuracy, keep_last=WINDOW)
+        # Documents written before WindowedStats stored the derived average
+        if stats.has_stored_average:
+            update.unset(UpdateBuilder.path(*path, "average_time"))
+            stats.has_stored_average = False
+
+    def _apply_performance(self, update: UpdateBuilder, subject: str, topic: str, question_type: str,
+                           is_correct: bool, time_taken: float, concepts: List[str]):
+        """Apply one answer to the in-memory performance and record the matching Mongo operators."""
         # Update question type performance
         type_data = self.performance_data["question_types"][question_type]
-        type_data["total_attempts"] += 1
-        if is_correct:
-            type_data["correct_attempts"] += 1
-        
-        # Update time tracking
-        type_data["last_5_times"].append(time_taken)
-        if len(type_data["last_5_times"]) > 5:
-            type_data["last_5_times"].pop(0)
-        type_data["average_time"] = sum(type_data["last_5_times"]) / len(type_data["last_5_times"])
-        
-        # Update accuracy tracking
-        accuracy = type_data["correct_attempts"] / type_data["total_attempts"]
-        type_data["last_5_accuracy"].append(accuracy)
-        if len(type_data["last_5_accuracy"]) > 5:
-            type_data["last_5_accuracy"].pop(0)
+        self._apply_windowed_stats(update, ("question_types", question_type), type_data, is_correct, time_taken)
         
         # Update topic performance
         if topic not in self.performance_data["topics"][subject]:
-            self.performance_data["topics"][subject][topic] = {
-                "total_attempts": 0,
-                "correct_attempts": 0,
-                "average_time": 0,
-                "last_5_times": [],
-                "last_5_accuracy": []
-            }
-        
+            self.performance_data["topics"][subject][topic] = WindowedStats()
         topic_data = self.performance_data["topics"][subject][topic]
-        topic_data["total_attempts"] += 1
-        if is_correct:
-            topic_data["correct_attempts"] += 1
-        
-        # Update topic time tracking
-        topic_data["last_5_times"].append(time_taken)
-        if len(topic_data["last_5_times"]) > 5:
-            topic_data["last_5_times"].pop(0)
-        topic_data["average_time"] = sum(topic_data["last_5_times"]) / len(topic_data["last_5_times"])
-        
-        # Update topic accuracy tracking
-        topic_accuracy = topic_data["correct_attempts"] / topic_data["total_attempts"]
-        topic_data["last_5_accuracy"].append(topic_accuracy)
-        if len(topic_data["last_5_accuracy"]) > 5:
-            topic_data["last_5_accuracy"].pop(0)
+        self._apply_windowed_stats(update, ("topics", subject, topic), topic_data, is_correct, time_taken)
         
         # Update concept performance
         for concept in concepts:
@@ -266,11 +290,12 @@ class UserProgress:
                 }
             concept_data = self.performance_data["concepts"][concept]
             concept_data["total_attempts"] += 1
-            if is_correct:
-                concept_data["correct_attempts"] += 1
+            update.inc(UpdateBuilder.path("concepts", concept, "total_attempts"))
+            # Incremented by 0 for a wrong answer so a new concept stores every field
+            concept_data["correct_attempts"] += int(is_correct)
+            update.inc(UpdateBuilder.path("concepts", concept, "correct_attempts"), int(is_correct))
             concept_data["last_review"] = datetime.now().isoformat()
-        
-        self._save_performance_data()
+            update.set(UpdateBuilder.path("concepts", concept, "last_review"), concept_data["last_review"])
 
     def get_weak_areas(self) -> Tuple[List[str], List[str], List[str]]:
         """Get user's weak topics, question types, and concepts."""
@@ -279,20 +304,16 @@ class UserProgress:
         weak_concepts = []
         
         # Analyze question type performance
-        for q_type, data in self.performance_data["question_types"].items():
-            if data["total_attempts"] >= 5:
-                accuracy = data["correct_attempts"] / data["total_attempts"]
-                avg_time = data["average_time"]
-                if accuracy < ACCURACY_THRESHOLD or avg_time > TIME_THRESHOLD:
+        for q_type, stats in self.performance_data["question_types"].items():
+            if stats.total_attempts >= 5:
+                if stats.accuracy < ACCURACY_THRESHOLD or stats.average_time > TIME_THRESHOLD:
                     weak_types.append(q_type)
         
         # Analyze topic performance
         for subject, topics in self.performance_data["topics"].items():
-            for topic, data in topics.items():
-                if data["total_attempts"] >= 5:
-                    accuracy = data["correct_attempts"] / data["total_attempts"]
-                    avg_time = data["average_time"]
-                    if accuracy < ACCURACY_THRESHOLD or avg_time > TIME_THRESHOLD:
+            for topic, stats in topics.items():
+                if stats.total_attempts >= 5:
+                    if stats.accuracy < ACCURACY_THRESHOLD or stats.average_time > TIME_THRESHOLD:
                         weak_topics.append(f"{subject}:{topic}")
         
         # Analyze concept performance
@@ -307,40 +328,99 @@ class UserProgress:
     def needs_concept_reinforcement(self, subject: str, topic: str) -> bool:
         """Check if user needs concept reinforcement for a topic."""
         if topic in self.performance_data["topics"][subject]:
-            data = self.performance_data["topics"][subject][topic]
-            if data["total_attempts"] >= 5:
-                accuracy = data["correct_attempts"] / data["total_attempts"]
-                return accuracy < CONCEPT_REINFORCEMENT_THRESHOLD
+            stats = self.performance_data["topics"][subject][topic]
+            if stats.total_attempts >= 5:
+                return stats.accuracy < CONCEPT_REINFORCEMENT_THRESHOLD
         return False
 
-    def _save_performance_data(self):
-        """Save user's performance data to MongoDB."""
-        mongodb.save_user_performance(self.user_id, self.performance_data)
+class _LoadedSource:
+    __slots__ = ('generation', 'value', 'checked_at')
+
+    def __init__(self, generation, value, checked_at):
+        self.generation = generation
+        self.value = value
+        self.checked_at = checked_at
 
 class QuestionDatabase:
-    def __init__(self):
-        self.questions = cloud_storage.get_questions()
-        self.questions_by_topic = self._organize_by_topic()
-        self.mmd_content = self._load_mmd_content()
-
-    def _load_mmd_content(self) -> Dict[str, Dict[str, str]]:
-        """Load content from MMD files from Cloud Storage."""
-        mmd_content = {
-            "mathematics": {},
-            "physics": {},
-            "chemistry": {}
-        }
-        
-        for subject in mmd_content.keys():
-            content = cloud_storage.get_mmd_content(subject)
-            if content:
-                mmd_content[subject] = self._parse_mmd_content(content)
-            else:
-                print(f"Note: MMD content for {subject} not found. Using questions only for context.")
-        
-        return mmd_content
+    """Original questions and parsed MMD books, shared by every caller in the process.
+
+    Get it with QuestionDatabase.instance(). The questions are loaded on first use
+    and each subject's MMD book is parsed the first time that subject is needed.
+    At most every QUESTION_DB_CHECK_SECONDS, the GCS generation of a source is
+    compared with the one it was loaded from, and a replaced source is reloaded.
+    """
 
-    def _parse_mmd_content(self, content: str) -> Dict[str, str]:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> "QuestionDatabase":
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, check_interval: float = QUESTION_DB_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._sources = {}
+        self._locks = {path: threading.Lock()
+                       for path in [STORAGE_PATHS['questions'], *STORAGE_PATHS['mmd_files'].values()]}
+
+    def _source(self, path: str, build):
+        """The value built from a GCS object, rebuilt when the object's generation changes."""
+        entry = self._sources.get(path)
+        if entry is not None and time.monotonic() - entry.checked_at < self.check_interval:
+            return entry.value
+        with self._locks[path]:
+            entry = self._sources.get(path)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                return entry.value
+            generation = cloud_storage.get_generation(path)
+            # Keep serving what we have when the object is unchanged or its metadata is unavailable
+            if entry is not None and generation in (None, entry.generation):
+                entry.checked_at = now
+                return entry.value
+            if entry is not None:
+                logger.info(f"{path} changed (generation {entry.generation} -> {generation}); reloading")
+            value = build()
+            self._sources[path] = _LoadedSource(generation, value, now)
+            return value
+
+    def _load_questions(self) -> Tuple[List[Dict], Dict[str, List[Dict]], Dict[str, Dict[str, List[Dict]]]]:
+        questions = cloud_storage.get_questions() or []
+        by_subject, by_topic = self._organize_questions(questions)
+        return questions, by_subject, by_topic
+
+    def _load_mmd(self, subject: str) -> Dict[str, str]:
+        """Load and parse one subject's MMD book from Cloud Storage."""
+        content = cloud_storage.get_mmd_content(subject)
+        if not content:
+            logger.info(f"MMD content for {subject} not found. Using questions only for context.")
+            return {}
+        return self._parse_mmd_content(content)
+
+    def _mmd(self, subject: str) -> Dict[str, str]:
+        path = STORAGE_PATHS['mmd_files'].get(subject)
+        if path is None:
+            return {}
+        return self._source(path, lambda: self._load_mmd(subject))
+
+    @property
+    def questions(self) -> List[Dict]:
+        return self._source(STORAGE_PATHS['questions'], self._load_questions)[0]
+
+    @property
+    def questions_by_subject(self) -> Dict[str, List[Dict]]:
+        return self._source(STORAGE_PATHS['questions'], self._load_questions)[1]
+
+    @property
+    def questions_by_topic(self) -> Dict[str, Dict[str, List[Dict]]]:
+        return self._source(STORAGE_PATHS['questions'], self._load_questions)[2]
+
+    @staticmethod
+    def _parse_mmd_content(content: str) -> Dict[str, str]:
         """Parse MMD content into a dictionary of topics and their content."""
         topics = {}
         current_topic = None
@@ -360,22 +440,24 @@ class QuestionDatabase:
         
         return topics
 
-    def _organize_by_topic(self) -> Dict[str, Dict[str, List[Dict]]]:
-        """Organize questions by subject and topic."""
-        organized = {
-            "mathematics": {},
-            "physics": {},
-            "chemistry": {}
+    def _organize_questions(self, questions: List[Dict]) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict[str, List[Dict]]]]:
+        """Organize questions by subject, and by subject and topic where a question has one."""
+        by_subject = {
+            "mathematics": [],
+            "physics": [],
+            "chemistry": []
         }
+        by_topic = {subject: {} for subject in by_subject}
         
-        for q in self.questions:
+        for q in questions:
             subject = q['subject'].lower()
-            topic = q['topic']
-            if topic not in organized[subject]:
-                organized[subject][topic] = []
-            organized[subject][topic].append(q)
+            by_subject.setdefault(subject, []).append(q)
+            # original_questions.json has no topic field; topic-tagged questions are grouped too
+            topic = q.get('topic')
+            if topic:
+                by_topic.setdefault(subject, {}).setdefault(topic, []).append(q)
         
-        return organized
+        return by_subject, by_topic
 
     def get_questions_by_topic(self, subject: str, topic: str) -> List[Dict]:
         """Get all questions for a specific topic."""
@@ -383,22 +465,23 @@ class QuestionDatabase:
 
     def get_mmd_content(self, subject: str, topic: str) -> Optional[str]:
         """Get MMD content for a specific topic."""
-        return self.mmd_content.get(subject.lower(), {}).get(topic)
+        return self._mmd(subject.lower()).get(topic)
 
     def get_similar_questions(self, subject: str, topic: str, num_questions: int = 3) -> List[Dict]:
         """Get similar questions from the database for reference."""
-        subject_questions = self.questions_by_topic[subject]
+        # Same-topic questions when there are any, otherwise any question of the subject
+        candidates = self.get_questions_by_topic(subject, topic) or self.questions_by_subject.get(subject.lower(), [])
         # For now, randomly select questions. In a real implementation, 
         # we would use semantic similarity to find truly similar questions
-        return random.sample(subject_questions, min(num_questions, len(subject_questions)))
+        return random.sample(candidates, min(num_questions, len(candidates)))
 
     def get_topic_content(self, subject: str, topic: str) -> str:
         """Get MMD content for a specific topic."""
-        return self.mmd_content[subject].get(topic, "")
+        return self._mmd(subject).get(topic, "")
 
     def get_concept_content(self, subject: str, topic: str) -> str:
         """Get MMD content for a specific topic, formatted for concept reinforcement."""
-        content = self.mmd_content[subject].get(topic, "")
+        content = self._mmd(subject).get(topic, "")
         if content:
             return f"""Here's a quick review of key concepts for {topic}:
 
@@ -481,7 +564,7 @@ def extract_json_from_text(text: str) -> dict:
         if match:
             return json.loads(match.group(0))
     except Exception as e:
-        print(f"Error extracting JSON from text: {e}")
+        logger.error(f"Error extracting JSON from text: {e}")
     return None
 
 def dummy_question(subject, topic, question_type, difficulty):
@@ -497,21 +580,16 @@ def dummy_question(subject, topic, question_type, difficulty):
         "concepts_tested": ["Addition"]
     }
 
-def generate_personalized_questions(user_id: str, num_questions: int = 5) -> List[Dict]:
-    """Generate personalized questions for a user based on their progress and weak areas."""
-    # Initialize user progress tracker and question database
-    user_progress = UserProgress(user_id)
-    question_db = QuestionDatabase()
-    
+def plan_question_slots(user_progress: UserProgress, question_db: QuestionDatabase,
+                        num_questions: int) -> List[Dict]:
+    """Choose subject, topic, type and mastery for every question up front and build their prompts."""
     # Get weak areas
     weak_topics, weak_types, weak_concepts = user_progress.get_weak_areas()
     
     # Load topic distribution
     topic_dist = load_topic_distribution()
     
-    # Generate questions
-    generated_questions = []
-    
+    slots = []
     for _ in range(num_questions):
         # Select subject and topic based on weak areas
         if weak_topics:
@@ -526,10 +604,10 @@ def generate_personalized_questions(user_id: str, num_questions: int = 5) -> Lis
         else:
             question_type = select_question_type()
         
-        # Ensure topic is initialized in progress data
-        if topic not in user_progress.progress_data["subjects"][subject]:
-            user_progress.progress_data["subjects"][subject][topic] = user_progress._initialize_topic_progress()
-        mastery_level = user_progress.progress_data["subjects"][subject][topic]["mastery_level"]
+        # Untracked topics start at mastery 0; the cached progress is only changed by answers
+        topic_progress = (user_progress.progress_data["subjects"][subject].get(topic)
+                          or user_progress._initialize_topic_progress())
+        mastery_level = topic_progress["mastery_level"]
         
         # Check if concept reinforcement is needed
         needs_reinforcement = user_progress.needs_concept_reinforcement(subject, topic)
@@ -538,46 +616,70 @@ def generate_personalized_questions(user_id: str, num_questions: int = 5) -> Lis
         similar_questions = question_db.get_similar_questions(subject, topic)
         topic_content = question_db.get_concept_content(subject, topic) if needs_reinforcement else question_db.get_topic_content(subject, topic)
         
-        print(f"Generating {question_type} question for {subject} - {topic} (Mastery Level: {mastery_level})")
-        if needs_reinforcement:
-            print(f"Adding concept reinforcement for {topic}")
-        
-        # Generate question with context
-        prompt = generate_question_prompt(subject, topic, question_type, 
-                                        similar_questions, topic_content, mastery_level,
-                                        needs_reinforcement)
-        
-        # Robust Gemini API call with retries and JSON extraction
-        max_attempts = 3
-        question_data = None
-        for attempt in range(1, max_attempts+1):
+        slots.append({
+            "subject": subject,
+            "topic": topic,
+            "question_type": question_type,
+            "mastery_level": mastery_level,
+            "needs_reinforcement": needs_reinforcement,
+            "prompt": generate_question_prompt(subject, topic, question_type,
+                                               similar_questions, topic_content, mastery_level,
+                                               needs_reinforcement)
+        })
+    return slots
+
+def generate_question_for_slot(slot: Dict, max_attempts: int = 3) -> Dict:
+    """Generate one planned question, retrying on its own; falls back to a dummy question."""
+    subject, topic, question_type = slot["subject"], slot["topic"], slot["question_type"]
+    mastery_level = slot["mastery_level"]
+    logger.info(f"Generating {question_type} question for {subject} - {topic} (Mastery Level: {mastery_level})")
+    if slot["needs_reinforcement"]:
+        logger.info(f"Adding concept reinforcement for {topic}")
+    
+    # Robust Gemini API call with retries and JSON extraction
+    question_data = None
+    for attempt in range(1, max_attempts+1):
+        try:
+            response = model.generate_content(slot["prompt"])
+            raw_output_logger.info(f"[Gemini raw response attempt {attempt}]: {response.text}")
             try:
-                response = model.generate_content(prompt)
-                print(f"[Gemini raw response attempt {attempt}]:\n{response.text}\n---")
-                try:
-                    question_data = json.loads(response.text)
-                    print(f"Successfully parsed JSON for {topic}")
+                question_data = json.loads(response.text)
+                logger.info(f"Successfully parsed JSON for {topic}")
+                break
+            except json.JSONDecodeError:
+                logger.warning(f"Failed to parse JSON for {topic} on attempt {attempt}. Trying to extract JSON...")
+                question_data = extract_json_from_text(response.text)
+                if question_data:
+                    logger.info(f"Successfully extracted JSON for {topic}")
                     break
-                except json.JSONDecodeError:
-                    print(f"Failed to parse JSON for {topic} on attempt {attempt}. Trying to extract JSON...")
-                    question_data = extract_json_from_text(response.text)
-                    if question_data:
-                        print(f"Successfully extracted JSON for {topic}")
-                        break
-            except Exception as e:
-                print(f"Error from Gemini API for {topic} on attempt {attempt}: {e}")
-            time.sleep(1)  # Wait before retry
-        
-        if not question_data:
-            print(f"All attempts failed for {topic}. Using dummy question.")
-            difficulty = "basic" if mastery_level <= 1 else "intermediate" if mastery_level <= 2 else "advanced"
-            question_data = dummy_question(subject, topic, question_type, difficulty)
-        
-        generated_questions.append(question_data)
+        except Exception as e:
+            logger.error(f"Error from Gemini API for {topic} on attempt {attempt}: {e}")
+        if attempt < max_attempts:
+            time.sleep(1)  # Wait before retry; only this slot's thread waits
+    
+    if not question_data:
+        logger.error(f"All attempts failed for {topic}. Using dummy question.")
+        difficulty = "basic" if mastery_level <= 1 else "intermediate" if mastery_level <= 2 else "advanced"
+        question_data = dummy_question(subject, topic, question_type, difficulty)
+    return question_data
+
+def generate_personalized_questions(user_id: str, num_questions: int = 5) -> List[Dict]:
+    """Generate personalized questions for a user based on their progress and weak areas.
+
+    All slots are planned first, then generated concurrently on gemini_executor,
+    so the call takes about as long as its slowest question. Questions come back
+    in slot order.
+    """
+    # Initialize user progress tracker and question database
+    user_progress = UserProgress(user_id)
+    question_db = QuestionDatabase.instance()
     
-    return generated_questions
+    slots = plan_question_slots(user_progress, question_db, num_questions)
+    futures = [gemini_executor.submit(generate_question_for_slot, slot) for slot in slots]
+    return [future.result() for future in futures]
 
 def main():
+    logging_setup.configure()
     # Test user ID
     user_id = "test_user_001"
     
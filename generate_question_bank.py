@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Bulk question-bank generation.
+
+Splits --total questions across every dist_topic.json topic in proportion to its
+weight, and each topic's share across --difficulties, then generates them with
+app.generate_question_rag_structured on --concurrency threads (each Gemini call
+is further bounded by GEMINI_MAX_CONCURRENCY and GEMINI_TIMEOUT_SECONDS).
+
+Questions are appended to rotating JSONL shards in --output-dir
+(bank-00000.jsonl, bank-00001.jsonl, ...), one question per line tagged with its
+plan unit. checkpoint.json records the finished units and the committed length
+of the current shard; after a crash, rerunning the same command truncates any
+lines written after the last checkpoint and generates only the missing units.
+Fallback questions are not written, so their units are retried on the next run.
+
+    python generate_question_bank.py --total 5000 --output-dir bank/
+    python generate_question_bank.py --total 300 --subjects physics --difficulties hard --concurrency 32
+
+Progress lines report questions/min, tokens and an estimated cost from
+--input-price/--output-price (USD per million tokens).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--total', type=int, required=True, help='questions in the whole plan')
+    parser.add_argument('--difficulties', default='easy,medium,hard', help='comma-separated, split evenly')
+    parser.add_argument('--subjects', help='comma-separated dist_topic.json subjects (default: all)')
+    parser.add_argument('--distribution', help='dist_topic.json to weight topics by (default: data/ or GCS)')
+    parser.add_argument('--output-dir', default='question_bank')
+    parser.add_argument('--shard-size', type=int, default=1000, help='questions per JSONL shard')
+    parser.add_argument('--concurrency', type=int, default=16, help='questions generated at once')
+    parser.add_argument('--checkpoint-every', type=int, default=25, help='questions between checkpoints')
+    parser.add_argument('--report-seconds', type=float, default=15.0)
+    parser.add_argument('--input-price', type=float, default=0.10, help='USD per million prompt tokens')
+    parser.add_argument('--output-price', type=float, default=0.40, help='USD per million output tokens')
+    return parser.parse_args()
+
+
+def allocate(total, weights):
+    """Split ``total`` in proportion to ``weights`` (largest remainder), as {key: count}."""
+    weight_sum = sum(weights.values())
+    if total <= 0 or weight_sum <= 0:
+        return {key: 0 for key in weights}
+    exact = {key: total * weight / weight_sum for key, weight in weights.items()}
+    counts = {key: int(value) for key, value in exact.items()}
+    leftover = total - sum(counts.values())
+    for key in sorted(exact, key=lambda k: exact[k] - counts[k], reverse=True)[:leftover]:
+        counts[key] += 1
+    return counts
+
+
+def build_plan(distribution, total, difficulties, subjects=None):
+    """Plan units as (subject, topic, difficulty, n), ordered so every topic starts early."""
+    weights = {(subject, topic): float(weight)
+               for subject, topics in distribution.items() if not subjects or subject in subjects
+               for topic, weight in topics.items()}
+    per_topic = allocate(total, weights)
+    per_cell = {}
+    for (subject, topic), count in per_topic.items():
+        for difficulty, n in allocate(count, {d: 1 for d in difficulties}).items():
+            per_cell[(subject, topic, difficulty)] = n
+    # Round-robin over cells so a partial run still covers the whole syllabus
+    plan = []
+    for round_index in range(max(per_cell.values(), default=0)):
+        for (subject, topic, difficulty), n in per_cell.items():
+            if round_index < n:
+                plan.append((subject, topic, difficulty, round_index))
+    return plan
+
+
+def unit_key(unit):
+    subject, topic, difficulty, n = unit
+    return f'{subject}|{topic}|{difficulty}|{n}'
+
+
+class ShardWriter:
+    """Appends JSON lines to rotating shards; commit() makes everything written so far durable."""
+
+    def __init__(self, output_dir, shard_size, shard=0, shard_lines=0, offset=0):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.shard = shard
+        self.shard_lines = shard_lines
+        # Drop lines written after the last checkpoint, including any later shard; they are regenerated
+        path = self.path()
+        if os.path.exists(path):
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        later = shard + 1
+        while os.path.exists(self.path(later)):
+            os.remove(self.path(later))
+            later += 1
+        self.file = open(path, 'ab')
+
+    def path(self, shard=None):
+        return os.path.join(self.output_dir, f'bank-{self.shard if shard is None else shard:05d}.jsonl')
+
+    def write(self, record):
+        if self.shard_lines >= self.shard_size:
+            self.commit()
+            self.file.close()
+            self.shard += 1
+            self.shard_lines = 0
+            self.file = open(self.path(), 'ab')
+        self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.shard_lines += 1
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'shard': self.shard, 'shard_lines': self.shard_lines, 'offset': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+def load_checkpoint(output_dir, settings):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint['settings'] != settings:
+        raise SystemExit(f'{path} was written for a different plan ({checkpoint["settings"]}); '
+                         f'use another --output-dir or delete it')
+    return checkpoint
+
+
+def save_checkpoint(output_dir, checkpoint):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def generate_unit(app_module, unit):
+    subject, topic, difficulty, _ = unit
+    start = time.perf_counter()
+    question = app_module.generate_question_rag_structured(subject.capitalize(), topic, difficulty)
+    usage = {}
+    raw_output = app_module.gemini_raw_outputs.get(question.get('raw_output_id') or 0)
+    if raw_output is not None:
+        usage = {key: raw_output.metadata.get(key, 0) for key in ('prompt_tokens', 'output_tokens')}
+    return question, usage, time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    if args.distribution:
+        with open(args.distribution, encoding='utf-8') as f:
+            distribution = json.load(f)
+    else:
+        distribution = None
+    import app as app_module
+
+    if distribution is None:
+        distribution = app_module.load_topic_distribution()
+    difficulties = [d.strip() for d in args.difficulties.split(',') if d.strip()]
+    subjects = [s.strip() for s in args.subjects.split(',')] if args.subjects else None
+    settings = {'total': args.total, 'difficulties': difficulties, 'subjects': subjects}
+    plan = build_plan(distribution, args.total, difficulties, subjects)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint = load_checkpoint(args.output_dir, settings) or {
+        'settings': settings, 'done': [], 'position': {'shard': 0, 'shard_lines': 0, 'offset': 0},
+        'stats': {'generated': 0, 'fallbacks': 0, 'prompt_tokens': 0, 'output_tokens': 0},
+    }
+    done = set(checkpoint['done'])
+    stats = checkpoint['stats']
+    pending = [unit for unit in plan if unit_key(unit) not in done]
+    writer = ShardWriter(args.output_dir, args.shard_size, **checkpoint['position'])
+    print(f"Plan: {len(plan)} questions over {len({u[:2] for u in plan})} topics; "
+          f"{len(plan) - len(pending)} already done, {len(pending)} to generate")
+
+    start = time.perf_counter()
+    session = {'generated': 0, 'fallbacks': 0}
+    last_report = start
+    since_checkpoint = 0
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        rate = session['generated'] / elapsed * 60 if elapsed else 0.0
+        cost = (stats['prompt_tokens'] * args.input_price + stats['output_tokens'] * args.output_price) / 1e6
+        remaining = len(plan) - len(done)
+        per_question = cost / stats['generated'] if stats['generated'] else 0.0
+        eta = f", ~{remaining / rate:.1f} min left" if rate and remaining else ''
+        print(f"{'Done' if final else 'Progress'}: {len(done)}/{len(plan)} questions, {rate:.1f} q/min{eta}; "
+              f"{session['fallbacks']} fallbacks this run; tokens {stats['prompt_tokens']} in / "
+              f"{stats['output_tokens']} out; cost ${cost:.4f} so far, "
+              f"~${cost + per_question * remaining:.4f} for the full plan", flush=True)
+
+    def checkpoint_now():
+        checkpoint['position'] = writer.commit()
+        checkpoint['done'] = sorted(done)
+        save_checkpoint(args.output_dir, checkpoint)
+
+    units = iter(pending)
+    in_flight = {}
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='bank') as pool:
+            def submit_next():
+                unit = next(units, None)
+                if unit is not None:
+                    in_flight[pool.submit(generate_unit, app_module, unit)] = unit
+            for _ in range(args.concurrency * 2):
+                submit_next()
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    unit = in_flight.pop(future)
+                    question, usage, seconds = future.result()
+                    stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+                    stats['output_tokens'] += usage.get('output_tokens', 0)
+                    if question.get('is_fallback'):
+                        stats['fallbacks'] += 1
+                        session['fallbacks'] += 1
+                    else:
+                        question.pop('raw_output_id', None)
+                        writer.write({**question, 'unit': unit_key(unit), 'generation_seconds': round(seconds, 3),
+                                      'generated_at': datetime.now(timezone.utc).isoformat(), **usage})
+                        done.add(unit_key(unit))
+                        stats['generated'] += 1
+                        session['generated'] += 1
+                        since_checkpoint += 1
+                    submit_next()
+                if since_checkpoint >= args.checkpoint_every:
+                    checkpoint_now()
+                    since_checkpoint = 0
+                if time.perf_counter() - last_report >= args.report_seconds:
+                    report()
+                    last_report = time.perf_counter()
+    except KeyboardInterrupt:
+        print('Interrupted; saving checkpoint (in-flight questions will be regenerated)')
+    finally:
+        checkpoint_now()
+        writer.close()
+    report(final=True)
+    return 0 if len(done) == len(plan) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,102 @@
 """Gunicorn configuration file."""
+import gc
+import glob
 import logging
+import os
 import sys
+import tempfile
+
+# Serving model. Request handling is dominated by waiting on Gemini, so the
+# default is a threaded worker: each process holds GUNICORN_THREADS requests
+# in flight. Set GUNICORN_WORKER_CLASS=gevent (requires the gevent package)
+# to run green threads instead and hold GUNICORN_WORKER_CONNECTIONS per process.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '500'))
+
+# A test is generated one question at a time, each bounded by
+# GEMINI_TIMEOUT_SECONDS (see gemini_config.py); leave headroom for context
+# retrieval and the database write so long tests are not killed by the worker timeout.
+from gemini_config import GEMINI_TIMEOUT_SECONDS, QUESTIONS_PER_TEST
+timeout = int(os.getenv('GUNICORN_TIMEOUT', QUESTIONS_PER_TEST * GEMINI_TIMEOUT_SECONDS + 30))
+graceful_timeout = timeout
+keepalive = 5
+
+# Prometheus multiprocess mode: every worker writes its samples to files in
+# this directory and /metrics aggregates them. It must be set before the app
+# (and prometheus_client) is imported, and must not hold a previous run's files.
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='jee-gurukul-metrics-')
+for _stale in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+    os.remove(_stale)
+
+# Preload mode: import the app and load the read-only datasets (original
+# questions, MMD books, topic distribution, optionally the RAG model) once in
+# the master; forked workers share those pages copy-on-write and start warm.
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+if preload_app and worker_class == 'gevent':
+    # The app is imported before gevent's worker would patch, so patch first
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def _ensure_schema(app, db, log):
+    with app.app_context():
+        log.info("Process has acquired the application context.")
+        from sqlalchemy import inspect
+        inspector = inspect(db.engine)
+
+        log.info("Checking for database tables...")
+        if not inspector.has_table("user"):
+            log.info("--> 'user' table not found. Creating all tables now...")
+            db.create_all()
+            log.info("--> All database tables created successfully.")
+        else:
+            log.info("--> 'user' table already exists. No action needed.")
+
 
 # This hook is run once in the master Gunicorn process.
 def on_starting(server):
     server.log.info("Gunicorn master process is starting.")
-    server.log.info("This is the final, correct database initialization method.")
+    if not preload_app:
+        return
+    try:
+        from app import app, db, preload_read_only_data
+        _ensure_schema(app, db, server.log)
+        preload_read_only_data()
+        with app.app_context():
+            # Workers must not share the master's database sockets
+            db.engine.dispose()
+        server.log.info("Read-only datasets preloaded in the master process.")
+    except Exception as e:
+        server.log.error(f"!!!!!! An unexpected error occurred while preloading: {e}", exc_info=True)
+        sys.exit(1)
+
+# Runs in the master just before each fork.
+def pre_fork(server, worker):
+    # Move everything allocated so far into the permanent generation so the
+    # cyclic GC never touches (and un-shares) the preloaded pages in workers.
+    gc.freeze()
+
+# Runs in the master after a worker has exited.
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
 
 # This hook is run in each worker process after it has been forked.
 def post_fork(server, worker):
     worker.log.info(f"Worker process (pid: {worker.pid}) has been forked.")
+
+    if preload_app:
+        try:
+            from app import reset_after_fork
+            reset_after_fork()
+        except Exception as e:
+            worker.log.error(f"!!!!!! An unexpected error occurred in the post_fork hook: {e}", exc_info=True)
+            sys.exit(1)
+        return
     
     # Wrap the entire database initialization in a try-except block
     # to catch any possible error and log it.
@@ -17,19 +104,7 @@ def post_fork(server, worker):
         worker.log.info("Attempting to import app and db in worker process...")
         from app import app, db
         worker.log.info("Successfully imported app and db.")
-
-        with app.app_context():
-            worker.log.info("Worker has acquired the application context.")
-            from sqlalchemy import inspect
-            inspector = inspect(db.engine)
-            
-            worker.log.info("Checking for database tables in worker process...")
-            if not inspector.has_table("user"):
-                worker.log.info("--> 'user' table not found. Creating all tables now...")
-                db.create_all()
-                worker.log.info("--> All database tables created successfully in worker.")
-            else:
-                worker.log.info("--> 'user' table already exists. No action needed.")
+        _ensure_schema(app, db, worker.log)
 
     except Exception as e:
         # If any exception occurs, log it directly to the worker's log.
@@ -0,0 +1,189 @@
+"""Asynchronous JSON logging.
+
+Request threads only format the message and put the record on a bounded queue;
+a background QueueListener thread serialises it to JSON and writes it to stderr,
+so log I/O adds no latency or lock contention to requests. When the queue is
+full, records are dropped and counted instead of blocking.
+
+High-volume loggers are sampled and their messages truncated before they reach
+the queue; raw Gemini output goes through RAW_OUTPUT_LOGGER for this reason.
+
+    LOG_LEVEL=INFO
+    LOG_FORMAT=json                      # or "text"
+    LOG_SAMPLE_RATES=gemini.raw_output=0.05,some.logger=0.5
+    LOG_MAX_MESSAGE_CHARS=8000           # any record
+    LOG_RAW_OUTPUT_CHARS=1000            # RAW_OUTPUT_LOGGER records
+    LOG_QUEUE_SIZE=10000
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from tracing import current_request_id
+
+RAW_OUTPUT_LOGGER = 'gemini.raw_output'
+
+DEFAULT_SAMPLE_RATES = {RAW_OUTPUT_LOGGER: 0.05}
+
+
+def _parse_sample_rates(spec):
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request ID when the record has one."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records of configured loggers (and their children)."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class TruncatingFilter(logging.Filter):
+    """Cut oversized messages and attach the request ID before the record is queued."""
+
+    def __init__(self, max_chars, raw_output_chars):
+        super().__init__()
+        self.max_chars = max_chars
+        self.raw_output_chars = raw_output_chars
+
+    def filter(self, record):
+        limit = self.raw_output_chars if record.name.startswith(RAW_OUTPUT_LOGGER) else self.max_chars
+        message = record.getMessage()
+        if len(message) > limit:
+            record.msg = f'{message[:limit]}... [truncated {len(message) - limit} chars]'
+            record.args = None
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id()
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full."""
+
+    dropped = 0
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but the traceback moves to exc_text (which the
+        # output formatter writes separately) instead of into the message
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+_output_handler = None
+_lock = threading.Lock()
+
+
+def configure():
+    """Route the root logger through the queue; safe to call more than once."""
+    global _handler, _output_handler
+    with _lock:
+        if _handler is not None:
+            return
+        _output_handler = logging.StreamHandler(sys.stderr)
+        if os.getenv('LOG_FORMAT', 'json') == 'text':
+            _output_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        else:
+            _output_handler.setFormatter(JsonFormatter())
+
+        _handler = DroppingQueueHandler(queue.Queue(int(os.getenv('LOG_QUEUE_SIZE', '10000'))))
+        _handler.addFilter(SamplingFilter(_parse_sample_rates(os.getenv('LOG_SAMPLE_RATES'))))
+        _handler.addFilter(TruncatingFilter(int(os.getenv('LOG_MAX_MESSAGE_CHARS', '8000')),
+                                            int(os.getenv('LOG_RAW_OUTPUT_CHARS', '1000'))))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+        _start_listener()
+        atexit.register(stop)
+
+
+def _start_listener():
+    global _listener
+    _listener = QueueListener(_handler.queue, _output_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def restart_after_fork():
+    """Give a forked worker its own queue and writer thread (threads do not survive fork)."""
+    global _listener
+    with _lock:
+        if _handler is None:
+            return
+        # The inherited queue's lock may have been held by the parent's writer thread
+        _handler.queue = queue.Queue(_handler.queue.maxsize)
+        _listener = None
+        _start_listener()
+
+
+def stop():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        if _handler is not None and _handler.dropped:
+            print(f'logging: dropped {_handler.dropped} records (queue full)', file=sys.stderr)
@@ -0,0 +1,81 @@
+"""Prometheus metrics for question generation, retrieval, caches and the database.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set by gunicorn.conf.py before the
+app is imported; every worker then writes its samples to files in that
+directory and /metrics aggregates all of them. Without it (flask run, scripts)
+the metrics simply live in the current process.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Gemini calls take seconds; storage and database operations take milliseconds
+SLOW_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+GEMINI_LATENCY = Histogram(
+    'jee_gemini_request_seconds', 'Latency of Gemini generate_content calls.',
+    ['outcome'], buckets=SLOW_BUCKETS)
+GCS_DOWNLOAD_LATENCY = Histogram(
+    'jee_gcs_download_seconds', 'Latency of Cloud Storage object downloads.',
+    ['object'], buckets=FAST_BUCKETS)
+RETRIEVAL_LATENCY = Histogram(
+    'jee_retrieval_seconds', 'Latency of context retrieval for a topic.',
+    ['subject'], buckets=FAST_BUCKETS)
+DB_COMMIT_LATENCY = Histogram(
+    'jee_db_commit_seconds', 'Latency of database commits.',
+    ['operation'], buckets=FAST_BUCKETS)
+FALLBACK_QUESTIONS = Counter(
+    'jee_fallback_questions_total', 'Fallback questions served instead of generated ones.',
+    ['reason'])
+CACHE_REQUESTS = Counter(
+    'jee_cache_requests_total', 'Cache lookups by cache and result (hit or miss).',
+    ['cache', 'result'])
+QUESTIONS_GENERATED = Counter(
+    'jee_questions_generated_total', 'Questions generated successfully by Gemini.',
+    ['subject', 'topic'])
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the wall time of the block on ``histogram`` with ``labels``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_fallback(reason):
+    # Reasons such as "structured_error: <exception text>" keep only their kind
+    FALLBACK_QUESTIONS.labels(reason=(reason or 'unknown').split(':', 1)[0]).inc()
+
+
+def render_latest():
+    """Return (body, content type) of the metrics exposition for all processes."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop the live-gauge files of an exited worker (gunicorn child_exit hook)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,73 @@
+"""initial schema
+
+Revision ID: 1a2b3c4d5e6f
+Revises: 
+Create Date: 2026-10-19 09:05:10.114027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a2b3c4d5e6f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases set up with 'flask init-db' or db.create_all() already have
+    # these tables; only create what is missing
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'user' not in existing:
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=128), nullable=True),
+        sa.Column('full_name', sa.String(length=100), nullable=True),
+        sa.Column('date_of_birth', sa.Date(), nullable=True),
+        sa.Column('mobile_number', sa.String(length=15), nullable=True),
+        sa.Column('google_id', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_login', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('google_id')
+        )
+    if 'test_history' not in existing:
+        op.create_table('test_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=50), nullable=False),
+        sa.Column('topic', sa.String(length=100), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=True),
+        sa.Column('time_taken', sa.Integer(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'question_attempt' not in existing:
+        op.create_table('question_attempt',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('test_id', sa.Integer(), nullable=False),
+        sa.Column('question_text', sa.Text(), nullable=False),
+        sa.Column('user_answer', sa.Text(), nullable=True),
+        sa.Column('correct_answer', sa.Text(), nullable=False),
+        sa.Column('is_correct', sa.Boolean(), nullable=True),
+        sa.Column('difficulty', sa.String(length=20), nullable=True),
+        sa.Column('hint_used', sa.Boolean(), nullable=True),
+        sa.Column('solution_viewed', sa.Boolean(), nullable=True),
+        sa.Column('concept_clarity_viewed', sa.Boolean(), nullable=True),
+        sa.Column('hint', sa.Text(), nullable=True),
+        sa.Column('concept', sa.Text(), nullable=True),
+        sa.Column('solution', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['test_id'], ['test_history.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('question_attempt')
+    op.drop_table('test_history')
+    op.drop_table('user')
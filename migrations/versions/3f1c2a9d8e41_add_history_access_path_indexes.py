@@ -0,0 +1,33 @@
+"""add history access path indexes
+
+Revision ID: 3f1c2a9d8e41
+Revises: 1a2b3c4d5e6f
+Create Date: 2026-10-19 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8e41'
+down_revision = '1a2b3c4d5e6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables may already carry these indexes when they were created by
+    # db.create_all() from the current models, hence if_not_exists.
+    op.create_index('ix_test_history_user_id_completed_at', 'test_history',
+                    ['user_id', sa.text('completed_at DESC')],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_question_attempt_test_id_id', 'question_attempt',
+                    ['test_id', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_question_attempt_test_id_id', table_name='question_attempt',
+                  if_exists=True)
+    op.drop_index('ix_test_history_user_id_completed_at', table_name='test_history',
+                  if_exists=True)
@@ -0,0 +1,63 @@
+"""add user topic stats
+
+Revision ID: 8b7e4d2c1a90
+Revises: 3f1c2a9d8e41
+Create Date: 2026-10-19 11:40:03.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b7e4d2c1a90'
+down_revision = '3f1c2a9d8e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() in the gunicorn hooks may have created the table already
+    if sa.inspect(op.get_bind()).has_table('user_topic_stats'):
+        return
+    op.create_table('user_topic_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=50), nullable=False),
+    sa.Column('topic', sa.String(length=100), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.Column('incorrect', sa.Integer(), nullable=False),
+    sa.Column('unattempted', sa.Integer(), nullable=False),
+    sa.Column('total_score', sa.Integer(), nullable=False),
+    sa.Column('total_time', sa.Integer(), nullable=False),
+    sa.Column('last_attempt_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'subject', 'topic', name='uq_user_topic_stats_user_subject_topic')
+    )
+
+    # Backfill from tests that were already submitted
+    op.execute("""
+        INSERT INTO user_topic_stats (user_id, subject, topic, attempts, correct, incorrect,
+                                      unattempted, total_score, total_time, last_attempt_at)
+        SELECT th.user_id, LOWER(th.subject), th.topic, COUNT(*),
+               SUM(COALESCE(qa.correct, 0)), SUM(COALESCE(qa.incorrect, 0)),
+               SUM(COALESCE(qa.unattempted, 0)), SUM(th.score),
+               SUM(COALESCE(th.time_taken, 0)), MAX(th.completed_at)
+        FROM test_history th
+        LEFT JOIN (
+            SELECT test_id,
+                   SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) AS correct,
+                   SUM(CASE WHEN NOT is_correct THEN 1 ELSE 0 END) AS incorrect,
+                   SUM(CASE WHEN is_correct IS NULL THEN 1 ELSE 0 END) AS unattempted
+            FROM question_attempt
+            GROUP BY test_id
+        ) qa ON qa.test_id = th.id
+        WHERE th.score IS NOT NULL
+        GROUP BY th.user_id, LOWER(th.subject), th.topic
+    """)
+
+
+def downgrade():
+    op.drop_table('user_topic_stats')
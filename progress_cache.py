@@ -0,0 +1,222 @@
+"""Per-worker write-behind cache of UserProgress documents.
+
+A user's progress and performance documents are read from MongoDB once per
+worker and kept here, with the user's ReviewHeap. Answers update the cached
+documents straight away, so later reads in the same worker see them, and queue
+targeted update operators and review reschedules. Those are coalesced per user
+and written by a background thread as one bulk write per dirty user:
+
+    PROGRESS_FLUSH_SECONDS=5        # flush dirty users this often
+    PROGRESS_FLUSH_MAX_DIRTY=100    # ...or as soon as this many users are dirty
+    PROGRESS_CACHE_USERS=1000       # users kept in memory (least recently used clean ones evicted)
+    PROGRESS_CACHE_TTL_SECONDS=30   # reload a clean user's documents after this long
+
+Other workers write to the same documents, and answers $set fields derived
+from the cached counts, so a clean user is reloaded from MongoDB on the next
+access after a successful flush or once the TTL has passed. Users with writes
+queued or in flight are never reloaded.
+
+Each batch carries a token that apply_user_updates records on the documents, so
+when a bulk write fails after part of it landed, retrying the batch does not count
+its answers twice. A failed batch is retried on the next flush, before anything
+queued since. Pending updates are flushed when the interpreter exits; call flush()
+before stopping a worker any other way. Workers do not share the cache, so reads are
+only guaranteed to see writes made in the same process.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from db_config import mongodb, UpdateBuilder
+from review_schedule import ReviewHeap
+
+logger = logging.getLogger(__name__)
+
+
+class PendingWrites:
+    """A user's unflushed progress and performance operators and review reschedules."""
+
+    __slots__ = ('progress', 'performance', 'reviews', 'token')
+
+    def __init__(self):
+        self.progress = UpdateBuilder()
+        self.performance = UpdateBuilder()
+        self.reviews = {}
+        # Identifies this batch to MongoDB so a retry is applied at most once
+        self.token = uuid.uuid4().hex
+
+    def __bool__(self):
+        return bool(self.progress or self.performance or self.reviews)
+
+
+class CachedUser:
+    __slots__ = ('user_id', 'progress', 'performance', 'reviews', 'lock', 'pending', 'failed', 'writing',
+                 'expires_at')
+
+    def __init__(self, user_id, progress, performance, expires_at):
+        self.user_id = user_id
+        self.lock = threading.RLock()
+        self.pending = None
+        # Batches whose write failed, oldest first; retried before pending
+        self.failed = []
+        self.writing = False
+        self.reset(progress, performance, expires_at)
+
+    def reset(self, progress, performance, expires_at):
+        self.progress = progress
+        self.performance = performance
+        self.reviews = ReviewHeap(self.user_id)
+        self.expires_at = expires_at
+
+    def is_clean(self):
+        return not (self.pending or self.failed or self.writing)
+
+
+class ProgressCache:
+    def __init__(self, flush_seconds, max_dirty, max_users, ttl_seconds=30.0):
+        self.flush_seconds = flush_seconds
+        self.max_dirty = max_dirty
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._users = OrderedDict()
+        self._dirty = {}
+        self._lock = threading.Lock()
+        # Flushes run one at a time so a user's batches reach MongoDB in order
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def get(self, user_id, load):
+        """The cached user, loading ``(progress, performance)`` with ``load()`` on a miss or once expired."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+        if user is not None:
+            with user.lock:
+                # Refreshed in place: other threads may hold this CachedUser
+                if time.monotonic() >= user.expires_at and user.is_clean():
+                    user.reset(*load(), time.monotonic() + self.ttl_seconds)
+            return user
+        progress, performance = load()
+        with self._lock:
+            # Another thread may have loaded the same user meanwhile; keep the first
+            user = self._users.setdefault(
+                user_id, CachedUser(user_id, progress, performance, time.monotonic() + self.ttl_seconds))
+            self._users.move_to_end(user_id)
+            self._evict()
+        return user
+
+    @contextmanager
+    def updating(self, user):
+        """Lock ``user`` and yield its PendingWrites."""
+        with user.lock:
+            if user.pending is None:
+                user.pending = PendingWrites()
+            yield user.pending
+        self._mark_dirty(user)
+
+    def _mark_dirty(self, user):
+        with self._lock:
+            self._dirty[user.user_id] = user
+            # Keep dirty users cached even if they were evicted while being updated
+            self._users.setdefault(user.user_id, user)
+            dirty = len(self._dirty)
+        self._ensure_flusher()
+        if dirty >= self.max_dirty:
+            self._wake.set()
+
+    def _evict(self):
+        excess = len(self._users) - self.max_users
+        if excess <= 0:
+            return
+        clean = [user_id for user_id in self._users if user_id not in self._dirty][:excess]
+        for user_id in clean:
+            del self._users[user_id]
+
+    def flush(self):
+        """Write every dirty user's pending updates to MongoDB; returns the number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = list(self._dirty.values()), {}
+            written = 0
+            for user in dirty:
+                with user.lock:
+                    batches, user.failed = user.failed, []
+                    if user.pending:
+                        batches.append(user.pending)
+                    user.pending = None
+                    user.writing = True
+                try:
+                    if self._write(user, batches):
+                        written += 1
+                        with user.lock:
+                            # Reload on next access, picking up other workers' writes
+                            user.expires_at = 0.0
+                finally:
+                    with user.lock:
+                        user.writing = False
+            return written
+
+    def _write(self, user, batches):
+        """Write ``batches`` in order; on an error keep the unwritten ones for the next flush."""
+        for index, pending in enumerate(batches):
+            try:
+                mongodb.apply_user_updates(user.user_id, pending.progress, pending.performance,
+                                           pending.reviews, pending.token)
+            except Exception as e:
+                logger.error(f"Error flushing progress for user {user.user_id}: {e}")
+                self._requeue(user, batches[index:])
+                return False
+            with user.lock:
+                user.reviews.flushed(pending.reviews)
+        return bool(batches)
+
+    def _requeue(self, user, batches):
+        """Keep failed batches, with their tokens, to retry before whatever was queued since."""
+        with user.lock:
+            user.failed = batches + user.failed
+        with self._lock:
+            self._dirty[user.user_id] = user
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork, so a forked worker starts its own
+        if self._flusher_pid == os.getpid() or self._closed.is_set():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Progress flush failed: {e}")
+
+    def close(self):
+        """Stop the flush thread and write whatever is still pending."""
+        self._closed.set()
+        self._wake.set()
+        self.flush()
+
+
+progress_cache = ProgressCache(
+    flush_seconds=float(os.getenv('PROGRESS_FLUSH_SECONDS', '5')),
+    max_dirty=int(os.getenv('PROGRESS_FLUSH_MAX_DIRTY', '100')),
+    max_users=int(os.getenv('PROGRESS_CACHE_USERS', '1000')),
+    ttl_seconds=float(os.getenv('PROGRESS_CACHE_TTL_SECONDS', '30')),
+)
+atexit.register(progress_cache.close)
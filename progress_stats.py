@@ -0,0 +1,88 @@
+"""Fixed-shape answer statistics for UserProgress.
+
+Each question type and topic in a user's performance document counts attempts
+and keeps the last WINDOW answer times and accuracies. In memory that is a
+WindowedStats record: one fixed-size ring buffer per window and a running sum of
+the times, so recording an answer and reading the average time are O(1). In
+MongoDB it is stored as the two counts and the two windows, oldest first; the
+average time follows from the window and is not stored. Records loaded from
+older documents that still store one have has_stored_average set until it is
+removed.
+"""
+
+WINDOW = 5
+
+
+class WindowedStats:
+    __slots__ = ('total_attempts', 'correct_attempts', 'has_stored_average',
+                 '_times', '_accuracies', '_count', '_next', '_time_sum')
+
+    def __init__(self, total_attempts=0, correct_attempts=0, times=(), accuracies=()):
+        self.total_attempts = total_attempts
+        self.correct_attempts = correct_attempts
+        self.has_stored_average = False
+        self._times = [0.0] * WINDOW
+        self._accuracies = [0.0] * WINDOW
+        self._count = 0
+        self._next = 0
+        self._time_sum = 0.0
+        # Both windows are appended together, so they share one ring position
+        kept = min(len(times), len(accuracies), WINDOW)
+        for time_taken, accuracy in zip(list(times)[len(times) - kept:], list(accuracies)[len(accuracies) - kept:]):
+            self._append(time_taken, accuracy)
+
+    def _append(self, time_taken, accuracy):
+        if self._count == WINDOW:
+            self._time_sum -= self._times[self._next]
+        else:
+            self._count += 1
+        self._times[self._next] = time_taken
+        self._accuracies[self._next] = accuracy
+        self._time_sum += time_taken
+        self._next = (self._next + 1) % WINDOW
+
+    def record(self, is_correct: bool, time_taken: float) -> float:
+        """Count one answer; returns the cumulative accuracy it adds to the window."""
+        self.total_attempts += 1
+        if is_correct:
+            self.correct_attempts += 1
+        accuracy = self.correct_attempts / self.total_attempts
+        self._append(time_taken, accuracy)
+        return accuracy
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct_attempts / self.total_attempts if self.total_attempts else 0.0
+
+    @property
+    def average_time(self) -> float:
+        """Mean of the windowed answer times."""
+        return self._time_sum / self._count if self._count else 0.0
+
+    def _ordered(self, ring):
+        start = (self._next - self._count) % WINDOW
+        return [ring[(start + i) % WINDOW] for i in range(self._count)]
+
+    @property
+    def last_times(self):
+        return self._ordered(self._times)
+
+    @property
+    def last_accuracies(self):
+        return self._ordered(self._accuracies)
+
+    def to_document(self):
+        return {
+            "total_attempts": self.total_attempts,
+            "correct_attempts": self.correct_attempts,
+            "last_5_times": self.last_times,
+            "last_5_accuracy": self.last_accuracies,
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        # Older documents also carry a stored average_time, which is ignored
+        stats = cls(doc.get("total_attempts", 0), doc.get("correct_attempts", 0),
+                    doc.get("last_5_times", ()), doc.get("last_5_accuracy", ()))
+        stats.has_stored_average = "average_time" in doc
+        return stats
@@ -0,0 +1,18 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+# Pydantic models for Gemini structured output
+class Option(BaseModel):
+    id: str  # A, B, C, D
+    text: str
+
+class QuestionData(BaseModel):
+    question_text: str
+    options: List[Option]
+    correct_answer: str
+    solution: str
+    difficulty: str = "medium"
+    hint: Optional[str] = None
+    concept: Optional[List[str]] = None  # Now a list of bullet points
@@ -1,20 +1,32 @@
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Tuple
 import pickle
-import io
-from cloud_config import cloud_storage, STORAGE_PATHS
+import threading
+
+# sentence_transformers, faiss, numpy and cloud_config are imported on first
+# use: importing this module must not load an embedding model or touch GCS.
 
 class RAGEngine:
     def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        self.model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
         self.index = None
         self.documents = []
         self.vector_dimension = 384  # Dimension for all-MiniLM-L6-v2
+
+    @property
+    def model(self):
+        """The SentenceTransformer, loaded on first access."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
         
     def _create_index(self):
         """Create a new FAISS index."""
+        import faiss
         self.index = faiss.IndexFlatL2(self.vector_dimension)
         
     def _process_mmd_content(self, content: str) -> List[str]:
@@ -25,6 +37,9 @@ class RAGEngine:
     
     def build_vector_db(self, subject: str):
         """Build vector database from MMD file for a specific subject."""
+        import numpy as np
+        from cloud_config import cloud_storage
+
         # Get MMD content
         mmd_content = cloud_storage.get_mmd_content(subject)
         if not mmd_content:
@@ -46,6 +61,9 @@ class RAGEngine:
         
     def _save_to_cloud(self, subject: str):
         """Save the vector database to Google Cloud Storage."""
+        import faiss
+        from cloud_config import cloud_storage
+
         # Save FAISS index
         index_bytes = faiss.serialize_index(self.index)
         index_blob_name = f'vector_db/{subject}_index.faiss'
@@ -58,6 +76,9 @@ class RAGEngine:
         
     def load_from_cloud(self, subject: str):
         """Load vector database from Google Cloud Storage."""
+        import faiss
+        from cloud_config import cloud_storage
+
         # Load FAISS index
         index_blob_name = f'vector_db/{subject}_index.faiss'
         index_bytes = cloud_storage.get_binary_file(index_blob_name)
@@ -70,6 +91,8 @@ class RAGEngine:
         
     def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
         """Search for relevant content using the query."""
+        import numpy as np
+
         if not self.index:
             raise ValueError("Vector database not loaded. Call load_from_cloud first.")
             
@@ -89,5 +112,20 @@ class RAGEngine:
                 
         return results
 
-# Initialize RAG engine
-rag_engine = RAGEngine() 
\ No newline at end of file
+# Shared RAG engine, created on first use
+_rag_engine = None
+_rag_engine_lock = threading.Lock()
+
+def get_rag_engine() -> RAGEngine:
+    global _rag_engine
+    if _rag_engine is None:
+        with _rag_engine_lock:
+            if _rag_engine is None:
+                _rag_engine = RAGEngine()
+    return _rag_engine
+
+def __getattr__(name):
+    # Keeps `from rag_engine import rag_engine` working without an import-time model load
+    if name == 'rag_engine':
+        return get_rag_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
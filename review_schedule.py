@@ -0,0 +1,238 @@
+"""Due-review lookups for spaced repetition.
+
+Every (user, subject, topic) a user has answered has one document in MongoDB's
+review_schedule collection, with next_review as a native datetime and an index on
+(user_id, next_review), so a user's due reviews are one range query however many
+topics they have covered.
+
+Within a worker, ReviewHeap keeps the user's reviews falling due in the next
+REVIEW_HEAP_HOURS (default 12) in a min-heap, together with any reschedules made
+in this worker that have not been flushed yet, so repeated lookups during a
+session neither scan the progress document nor go back to MongoDB.
+
+Progress documents written before the schedule collection existed can be indexed with
+
+    python review_schedule.py backfill
+
+The nightly job streams every review due by the end of the next day in due-date
+order and materialises one review queue per user, then prints (or writes) how
+many users have each topic due, for prewarming the question pool:
+
+    python review_schedule.py materialize --output demand.json
+
+Re-running it for the same day is idempotent, and an interrupted run resumes
+from its checkpoint.
+"""
+import argparse
+import heapq
+import json
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+from db_config import mongodb, unescape_document
+
+REVIEW_HEAP_HOURS = float(os.getenv('REVIEW_HEAP_HOURS', '12'))
+
+# Constants for spaced repetition intervals (in days)
+SPACED_REPETITION_INTERVALS = {
+    1: 1,    # Level 1: Review next day
+    2: 3,    # Level 2: Review after 3 days
+    3: 7,    # Level 3: Review after a week
+    4: 14,   # Level 4: Review after two weeks
+    5: 30    # Level 5: Review after a month
+}
+
+
+def review_interval_days(mastery_level: int) -> int:
+    """Days until the next review of a topic at ``mastery_level``."""
+    return SPACED_REPETITION_INTERVALS.get(mastery_level + 1, 30)
+
+
+def as_utc(value: datetime) -> datetime:
+    # pymongo returns naive datetimes in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class ReviewHeap:
+    """One user's upcoming reviews; callers hold the user's lock."""
+
+    __slots__ = ('user_id', 'horizon', '_heap', '_current', '_local', '_loaded_until')
+
+    def __init__(self, user_id, horizon=timedelta(hours=REVIEW_HEAP_HOURS)):
+        self.user_id = user_id
+        self.horizon = horizon
+        self._heap = []
+        self._current = {}
+        # Reschedules made in this worker; they win over what MongoDB returns until flushed
+        self._local = {}
+        self._loaded_until = None
+
+    def _load(self, now):
+        self._loaded_until = now + self.horizon
+        self._current = {(entry['subject'], entry['topic']): as_utc(entry['next_review'])
+                         for entry in mongodb.get_review_schedule(self.user_id, self._loaded_until)}
+        self._current.update(self._local)
+        self._heap = [(due, subject, topic) for (subject, topic), due in self._current.items()
+                      if due <= self._loaded_until]
+        heapq.heapify(self._heap)
+
+    def schedule(self, subject, topic, next_review):
+        self._local[(subject, topic)] = next_review
+        self._current[(subject, topic)] = next_review
+        if self._loaded_until is not None and next_review <= self._loaded_until:
+            heapq.heappush(self._heap, (next_review, subject, topic))
+
+    def flushed(self, reviews):
+        """Drop local reschedules that ``reviews`` wrote to MongoDB, unless rescheduled again since."""
+        for key, fields in reviews.items():
+            if self._local.get(key) == fields['next_review']:
+                del self._local[key]
+
+    def due(self, now=None):
+        """(subject, topic) pairs due for review at ``now``, most overdue first."""
+        now = now or datetime.now(timezone.utc)
+        if self._loaded_until is None or now > self._loaded_until:
+            self._load(now)
+        due, seen = [], set()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            key = entry[1:]
+            # Skip entries superseded by a later reschedule (lazy deletion)
+            if key not in seen and self._current.get(key) == entry[0]:
+                seen.add(key)
+                due.append(entry)
+        for entry in due:
+            heapq.heappush(self._heap, entry)
+        return [(subject, topic) for _, subject, topic in due]
+
+
+def backfill(batch_size=500):
+    """Create schedule entries from the next_review strings in existing progress documents."""
+    written = 0
+    batch = {}
+    for doc in mongodb.progress_collection.find({}, {'subjects': 1}):
+        for subject, topics in unescape_document(doc.get('subjects', {})).items():
+            for topic, data in topics.items():
+                if not data.get('next_review'):
+                    continue
+                # Progress documents hold local-time ISO strings
+                next_review = datetime.fromisoformat(data['next_review']).astimezone(timezone.utc)
+                batch[(doc['_id'], subject, topic)] = {
+                    'next_review': next_review,
+                    'mastery_level': data.get('mastery_level', 0),
+                }
+        if len(batch) >= batch_size:
+            written += _write_backfill(batch)
+            batch = {}
+    return written + _write_backfill(batch)
+
+
+def _write_backfill(batch):
+    by_user = {}
+    for (user_id, subject, topic), fields in batch.items():
+        by_user.setdefault(user_id, {})[(subject, topic)] = fields
+    for user_id, reviews in by_user.items():
+        mongodb.apply_user_updates(user_id, None, None, reviews)
+    return len(batch)
+
+
+def review_priority(entry, until):
+    """How overdue an entry will be at ``until``, in multiples of its review interval."""
+    overdue_days = (until - as_utc(entry['next_review'])).total_seconds() / 86400
+    return round(overdue_days / review_interval_days(entry.get('mastery_level', 0)), 3)
+
+
+def materialize_queues(run_date: date, batch_size=1000, restart=False):
+    """Build the review queues for everything due by the end of ``run_date``; returns topic demand.
+
+    Entries are streamed in (next_review, _id) order and set in each user's
+    review_queues document under their subject and topic, so re-processing a batch
+    after a crash, even one rescheduled meanwhile, leaves one item per topic. The position of the last written batch is checkpointed in
+    review_runs; demand is aggregated from the queues themselves once the
+    stream is exhausted.
+    """
+    run = run_date.isoformat()
+    until = datetime.combine(run_date, time.max, tzinfo=timezone.utc)
+    if restart:
+        mongodb.clear_review_run(run)
+    checkpoint = mongodb.review_runs_collection.find_one({'_id': run}) or {}
+    if checkpoint.get('status') == 'complete':
+        return checkpoint['demand']
+
+    query = {'next_review': {'$lte': until}}
+    if checkpoint.get('last_next_review') is not None:
+        last_due, last_id = checkpoint['last_next_review'], checkpoint['last_id']
+        query = {'$and': [query, {'$or': [{'next_review': {'$gt': last_due}},
+                                          {'next_review': last_due, '_id': {'$gt': last_id}}]}]}
+    processed = checkpoint.get('processed', 0)
+
+    cursor = mongodb.stream_due_reviews(query, batch_size)
+    batch = []
+    for entry in cursor:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            processed += _write_queue_batch(run, until, batch)
+            batch = []
+    if batch:
+        processed += _write_queue_batch(run, until, batch)
+
+    demand = mongodb.review_queue_demand(run)
+    mongodb.review_runs_collection.update_one(
+        {'_id': run},
+        {'$set': {'status': 'complete', 'processed': processed, 'demand': demand,
+                  'completed_at': datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return demand
+
+
+def _write_queue_batch(run, until, batch):
+    items = {}
+    for entry in batch:
+        items.setdefault(entry['user_id'], []).append({
+            'subject': entry['subject'],
+            'topic': entry['topic'],
+            'next_review': entry['next_review'],
+            'priority': review_priority(entry, until),
+        })
+    mongodb.add_to_review_queues(run, items)
+    last = batch[-1]
+    mongodb.review_runs_collection.update_one(
+        {'_id': run},
+        {'$set': {'status': 'running', 'last_next_review': last['next_review'], 'last_id': last['_id'],
+                  'updated_at': datetime.now(timezone.utc)},
+         '$inc': {'processed': len(batch)}},
+        upsert=True
+    )
+    return len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spaced-repetition review schedule maintenance')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('backfill', help='index next_review from existing progress documents')
+    materialize = subcommands.add_parser('materialize', help='build per-user review queues for a day')
+    materialize.add_argument('--date', type=date.fromisoformat,
+                             default=datetime.now(timezone.utc).date() + timedelta(days=1),
+                             help='queue reviews due by the end of this UTC day (default: tomorrow)')
+    materialize.add_argument('--batch-size', type=int, default=1000)
+    materialize.add_argument('--restart', action='store_true', help='ignore the checkpoint of an earlier run')
+    materialize.add_argument('--output', help='write the topic demand to this JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        print(f"Backfilled {backfill()} review schedule entries")
+    elif args.command == 'materialize':
+        demand = materialize_queues(args.date, args.batch_size, args.restart)
+        print(f"Review queues for {args.date}: {sum(d['users'] for d in demand)} topic reviews "
+              f"across {len(demand)} topics")
+        for d in demand[:20]:
+            print(f"  {d['users']:>6}  {d['subject']} - {d['topic']}")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'date': args.date.isoformat(), 'demand': demand}, f, indent=2)
+            print(f"Demand written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
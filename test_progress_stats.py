@@ -0,0 +1,76 @@
+"""Unit tests for WindowedStats (progress_stats.py).
+
+    python -m pytest test_progress_stats.py
+"""
+import pytest
+
+from progress_stats import WINDOW, WindowedStats
+
+
+def test_window_keeps_the_last_answers_oldest_first():
+    stats = WindowedStats()
+    for seconds in range(1, WINDOW + 3):
+        stats.record(seconds % 2 == 0, float(seconds))
+
+    assert stats.total_attempts == WINDOW + 2
+    assert stats.correct_attempts == (WINDOW + 2) // 2
+    assert stats.last_times == [float(s) for s in range(3, WINDOW + 3)]
+    assert len(stats.last_accuracies) == WINDOW
+
+
+def test_recorded_accuracy_is_cumulative():
+    stats = WindowedStats()
+    assert stats.record(True, 10.0) == 1.0
+    assert stats.record(False, 10.0) == 0.5
+    assert stats.record(False, 10.0) == pytest.approx(1 / 3)
+    assert stats.last_accuracies == [1.0, 0.5, pytest.approx(1 / 3)]
+    assert stats.accuracy == pytest.approx(1 / 3)
+
+
+def test_average_time_covers_only_the_window():
+    stats = WindowedStats()
+    assert stats.average_time == 0.0
+    for seconds in (100.0, 1.0, 2.0, 3.0, 4.0, 5.0):
+        stats.record(True, seconds)
+    # 100.0 has wrapped out of the ring and out of the running sum
+    assert stats.average_time == pytest.approx(3.0)
+
+
+def test_round_trip_through_the_stored_document():
+    stats = WindowedStats()
+    for seconds in range(1, WINDOW + 4):
+        stats.record(seconds % 3 == 0, float(seconds))
+
+    restored = WindowedStats.from_document(stats.to_document())
+    assert restored.to_document() == stats.to_document()
+    assert restored.average_time == pytest.approx(stats.average_time)
+
+    restored.record(True, 50.0)
+    assert restored.last_times == stats.last_times[1:] + [50.0]
+
+
+def test_from_legacy_document_without_windows():
+    stats = WindowedStats.from_document({"total_attempts": 4, "correct_attempts": 3, "average_time": 12.0})
+
+    assert stats.accuracy == 0.75
+    # The stored average is ignored; with no window there is no average yet
+    assert stats.average_time == 0.0
+    assert stats.to_document() == {
+        "total_attempts": 4, "correct_attempts": 3, "last_5_times": [], "last_5_accuracy": [],
+    }
+    assert stats.has_stored_average
+    assert not WindowedStats.from_document(stats.to_document()).has_stored_average
+    assert WindowedStats.from_document({}).total_attempts == 0
+
+
+def test_from_document_trims_long_and_uneven_windows():
+    stats = WindowedStats.from_document({
+        "total_attempts": 9,
+        "correct_attempts": 9,
+        "last_5_times": [float(s) for s in range(1, 10)],
+        "last_5_accuracy": [1.0, 1.0, 1.0],
+    })
+
+    assert stats.last_times == [7.0, 8.0, 9.0]
+    assert stats.last_accuracies == [1.0, 1.0, 1.0]
+    assert stats.average_time == pytest.approx(8.0)
@@ -0,0 +1,68 @@
+"""Unit tests for the Mongo updates UserProgress builds for each answer.
+
+    python -m pytest test_progress_updates.py
+"""
+import pytest
+
+from progress_cache import PendingWrites, ProgressCache
+
+try:
+    import generate_gemini_questions
+except (ImportError, OSError) as e:
+    # It connects to Cloud Storage at import, so it needs the service account file
+    pytest.skip(f"generate_gemini_questions is not importable here: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def user(monkeypatch):
+    """A UserProgress for a user with no stored documents, using a private cache."""
+    monkeypatch.setattr(generate_gemini_questions, "progress_cache", ProgressCache(5, 100, 10))
+    monkeypatch.setattr(generate_gemini_questions.mongodb, "get_user_progress", lambda user_id: {})
+    monkeypatch.setattr(generate_gemini_questions.mongodb, "get_user_performance", lambda user_id: {})
+    return generate_gemini_questions.UserProgress("user-1")
+
+
+def written_paths(update):
+    return {path for operator in ("$inc", "$set", "$push") for path in update.get(operator, {})}
+
+
+def test_new_topic_answered_wrong_writes_every_topic_field(user):
+    pending = PendingWrites()
+    user._apply_progress(pending, "physics", "Optics", False, 30.0)
+    update = pending.progress.to_update()
+
+    expected = {f"subjects.physics.Optics.{field}" for field in user._initialize_topic_progress()}
+    assert expected <= written_paths(update)
+    assert update["$inc"]["subjects.physics.Optics.correct_attempts"] == 0
+    assert update["$inc"]["total_correct_answers"] == 0
+    assert user.progress_data["subjects"]["physics"]["Optics"]["correct_attempts"] == 0
+
+
+def test_new_concept_and_topic_stats_answered_wrong_write_correct_attempts(user):
+    pending = PendingWrites()
+    user._apply_performance(pending.performance, "physics", "Optics", "mcq", False, 30.0, ["Refraction"])
+    update = pending.performance.to_update()
+
+    for path in ("question_types.mcq", "topics.physics.Optics", "concepts.Refraction"):
+        assert update["$inc"][f"{path}.correct_attempts"] == 0
+        assert update["$inc"][f"{path}.total_attempts"] == 1
+    assert "concepts.Refraction.last_review" in update["$set"]
+
+
+def test_topic_paths_are_escaped(user):
+    pending = PendingWrites()
+    user._apply_progress(pending, "physics", "Units $ Dimensions. Errors", True, 10.0)
+    update = pending.progress.to_update()
+
+    assert update["$inc"]["subjects.physics.Units ＄ Dimensions． Errors.correct_attempts"] == 1
+
+
+def test_stored_average_time_is_unset_once(user):
+    user.performance_data["question_types"]["mcq"] = generate_gemini_questions.WindowedStats.from_document(
+        {"total_attempts": 3, "correct_attempts": 2, "average_time": 40.0})
+    first, second = PendingWrites(), PendingWrites()
+    user._apply_performance(first.performance, "physics", "Optics", "mcq", True, 30.0, [])
+    user._apply_performance(second.performance, "physics", "Optics", "mcq", True, 30.0, [])
+
+    assert first.performance.to_update()["$unset"] == {"question_types.mcq.average_time": ""}
+    assert "$unset" not in second.performance.to_update()
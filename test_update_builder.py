@@ -0,0 +1,85 @@
+"""Unit tests for the targeted update operators UpdateBuilder produces (db_config.py).
+
+    python -m pytest test_update_builder.py
+"""
+from db_config import UpdateBuilder
+
+
+def test_operations_on_the_same_path_are_merged():
+    update = (UpdateBuilder()
+              .inc("total", 1).inc("total", 2)
+              .set("streak", 1).set("streak", 0)
+              .push("times", 1.0, keep_last=5).push("times", 2.0, keep_last=5)
+              .to_update())
+
+    assert update == {
+        "$inc": {"total": 3},
+        "$set": {"streak": 0},
+        "$push": {"times": {"$each": [1.0, 2.0], "$slice": -5}},
+    }
+
+
+def test_path_escapes_each_part():
+    assert UpdateBuilder.path("concepts", "Newton's 2nd law. F=ma", "$ratio") == \
+        "concepts.Newton's 2nd law． F=ma.＄ratio"
+
+
+def test_unset_paths_are_sorted_and_empty():
+    update = UpdateBuilder().unset("b.average_time").unset("a.average_time").unset("a.average_time").to_update()
+    assert update == {"$unset": {"a.average_time": "", "b.average_time": ""}}
+
+
+def test_set_on_insert_only_without_other_operators_is_not_an_update():
+    builder = UpdateBuilder().set_on_insert({"total": 0})
+    assert not builder
+    assert UpdateBuilder().unset("x")
+
+
+def test_set_on_insert_skips_paths_written_by_other_operators():
+    defaults = {"total": 0, "correct": 0, "last_session": None}
+    update = UpdateBuilder().inc("total").set("last_session", "today").set_on_insert(defaults).to_update()
+
+    assert update["$setOnInsert"] == {"correct": 0}
+
+
+def test_set_on_insert_descends_into_parents_of_written_paths():
+    defaults = {
+        "subjects": {"mathematics": {}, "physics": {}, "chemistry": {}},
+        "streak_days": 0,
+    }
+    update = UpdateBuilder().inc("subjects.physics.Optics.total_attempts").set_on_insert(defaults).to_update()
+
+    # Setting "subjects" or "subjects.physics" would conflict with the $inc below them
+    assert update["$setOnInsert"] == {
+        "subjects.mathematics": {},
+        "subjects.chemistry": {},
+        "streak_days": 0,
+    }
+
+
+def test_set_on_insert_drops_defaults_below_a_written_path():
+    defaults = {"question_types": {"mcq": {"total_attempts": 0, "last_5_times": []}}}
+    update = UpdateBuilder().set("question_types.mcq", {"total_attempts": 1}).set_on_insert(defaults).to_update()
+
+    assert "$setOnInsert" not in update
+
+
+def test_set_on_insert_drops_a_scalar_default_with_a_written_child():
+    update = UpdateBuilder().set("last_session.day", 1).set_on_insert({"last_session": None}).to_update()
+    assert "$setOnInsert" not in update
+
+
+def test_set_on_insert_treats_unset_and_push_as_written():
+    defaults = {"mcq": {"total_attempts": 0, "average_time": 0, "last_5_times": []}}
+    update = (UpdateBuilder()
+              .unset("mcq.average_time")
+              .push("mcq.last_5_times", 3.0, keep_last=5)
+              .set_on_insert(defaults)
+              .to_update())
+
+    assert update["$setOnInsert"] == {"mcq.total_attempts": 0}
+
+
+def test_set_on_insert_escapes_default_keys_in_paths():
+    update = UpdateBuilder().inc("concepts.other").set_on_insert({"concepts": {"a.b": 1}}).to_update()
+    assert update["$setOnInsert"] == {"concepts.a．b": 1}
@@ -0,0 +1,254 @@
+"""Lightweight per-request tracing.
+
+Each request gets a request ID and a root span; code on the request path opens
+nested spans with ``with span('stage', key=value):``. When the request ends the
+span tree is
+
+* appended as one JSON line to TRACE_EXPORT_PATH, if set;
+* posted in OTLP/HTTP JSON form to TRACE_COLLECTOR_URL (e.g. an OpenTelemetry
+  collector's http://localhost:4318/v1/traces), if set, from a background thread
+  (when it falls 1000 traces behind, further traces are dropped and counted
+  rather than blocking requests);
+* logged with its per-stage breakdown when it took longer than SLOW_REQUEST_MS.
+
+Work handed to a thread pool joins the request's tree when submitted through
+``in_current_context``.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH')
+TRACE_COLLECTOR_URL = os.getenv('TRACE_COLLECTOR_URL')
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '5000'))
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'jee-gurukul')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'children',
+                 'start_ns', 'end_ns', '_start_perf', 'duration_ms')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.children = []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start_perf = time.perf_counter()
+        self.duration_ms = None
+
+    def finish(self):
+        if self.end_ns is None:
+            self.duration_ms = (time.perf_counter() - self._start_perf) * 1000
+            self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'start_ns': self.start_ns,
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'attributes': self.attributes,
+            'children': [child.to_dict() for child in list(self.children)],
+        }
+
+    def walk(self, depth=0):
+        yield depth, self
+        for child in list(self.children):
+            yield from child.walk(depth + 1)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_request_id():
+    root = _current_span.get()
+    return root.trace_id if root is not None else None
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a stage as a child of the current span (a no-op parent outside requests)."""
+    parent = _current_span.get()
+    if parent is None:
+        # Outside a traced request (CLI, scripts): keep the API, skip the bookkeeping
+        yield Span(name, trace_id='-', attributes=attributes)
+        return
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.attributes['error'] = repr(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def in_current_context(fn):
+    """Wrap ``fn`` so that, run on another thread, its spans join the caller's tree."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def start_trace(name, request_id=None, **attributes):
+    root = Span(name, request_id or uuid.uuid4().hex, attributes=attributes)
+    return root, _current_span.set(root)
+
+
+def finish_trace(root, token):
+    root.finish()
+    _current_span.reset(token)
+    if TRACE_EXPORT_PATH:
+        _export_jsonl(root)
+    if TRACE_COLLECTOR_URL:
+        _enqueue_for_collector(root)
+    if root.duration_ms >= SLOW_REQUEST_MS:
+        logger.warning(f"Slow request {root.trace_id} ({root.duration_ms:.0f} ms):\n{format_breakdown(root)}",
+                       extra={'request_id': root.trace_id})
+
+
+def format_breakdown(root):
+    lines = []
+    for depth, node in root.walk():
+        attrs = ' '.join(f'{k}={v}' for k, v in node.attributes.items())
+        duration = f'{node.duration_ms:9.1f} ms' if node.duration_ms is not None else '  running  '
+        lines.append(f"{duration}  {'  ' * depth}{node.name} {attrs}".rstrip())
+    return '\n'.join(lines)
+
+
+# JSONL exporter
+_export_lock = threading.Lock()
+
+
+def _export_jsonl(root):
+    line = json.dumps({'request_id': root.trace_id, 'pid': os.getpid(), **root.to_dict()}, default=str)
+    try:
+        with _export_lock, open(TRACE_EXPORT_PATH, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        logger.error(f"Could not write trace to {TRACE_EXPORT_PATH}: {e}")
+
+
+# OTLP/HTTP JSON exporter, off the request path
+_collector_queue = queue.Queue(maxsize=1000)
+_collector_thread = None
+_collector_thread_lock = threading.Lock()
+# Traces dropped because the collector fell behind and the queue was full
+dropped_traces = 0
+
+
+def _enqueue_for_collector(root):
+    global dropped_traces
+    try:
+        _collector_queue.put_nowait(root)
+    except queue.Full:
+        dropped_traces += 1
+        if dropped_traces == 1:
+            logger.warning(f"Trace export queue full; dropping traces until {TRACE_COLLECTOR_URL} catches up")
+    _ensure_collector_thread()
+
+
+def _ensure_collector_thread():
+    global _collector_thread
+    # Also restarts the thread in a freshly forked worker, where it does not exist
+    if _collector_thread is None or not _collector_thread.is_alive():
+        with _collector_thread_lock:
+            if _collector_thread is None or not _collector_thread.is_alive():
+                _collector_thread = threading.Thread(target=_collector_loop, name='trace-exporter', daemon=True)
+                _collector_thread.start()
+
+
+def _otlp_attributes(attributes):
+    return [{'key': str(k), 'value': {'stringValue': str(v)}} for k, v in attributes.items()]
+
+
+def _otlp_trace_id(request_id):
+    # OTLP wants 32 hex digits; incoming X-Request-IDs may be any string
+    compact = request_id.replace('-', '').lower()
+    if len(compact) == 32 and all(c in '0123456789abcdef' for c in compact):
+        return compact
+    return hashlib.md5(request_id.encode()).hexdigest()
+
+
+def to_otlp(root):
+    """Encode a span tree as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+    trace_id = _otlp_trace_id(root.trace_id)
+    spans = []
+    for _, node in root.walk():
+        otlp_span = {
+            'traceId': trace_id,
+            'spanId': node.span_id,
+            'name': node.name,
+            'kind': 2 if node is root else 1,  # SERVER for the request, INTERNAL for stages
+            'startTimeUnixNano': str(node.start_ns),
+            'endTimeUnixNano': str(node.end_ns or node.start_ns),
+            'attributes': _otlp_attributes(
+                {**node.attributes, 'request.id': root.trace_id} if node is root else node.attributes),
+        }
+        if node.parent_id:
+            otlp_span['parentSpanId'] = node.parent_id
+        spans.append(otlp_span)
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME})},
+        'scopeSpans': [{'scope': {'name': 'jee_gurukul.tracing'}, 'spans': spans}],
+    }]}
+
+
+def _collector_loop():
+    import requests
+    session = requests.Session()
+    while True:
+        root = _collector_queue.get()
+        try:
+            session.post(TRACE_COLLECTOR_URL, json=to_otlp(root), timeout=5)
+        except Exception as e:
+            logger.warning(f"Trace export to {TRACE_COLLECTOR_URL} failed: {e}")
+
+
+def init_app(app):
+    """Trace every non-static request of ``app`` and tag responses with X-Request-ID."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_trace():
+        if request.endpoint == 'static':
+            return
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.trace = start_trace(f'{request.method} {request.path}', request_id, endpoint=request.endpoint)
+
+    @app.after_request
+    def _tag_response(response):
+        trace = g.get('trace')
+        if trace is not None:
+            trace[0].set(status=response.status_code)
+            response.headers['X-Request-ID'] = trace[0].trace_id
+        return response
+
+    @app.teardown_request
+    def _finish_request_trace(exc):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            if exc is not None:
+                trace[0].set(error=repr(exc))
+            finish_trace(*trace)